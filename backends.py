@@ -0,0 +1,291 @@
+"""
+Headless canvases for rendering graphs without a display
+
+Each canvas provides the parts of tkinter.Canvas that Graph uses, so a
+Graph can draw onto one in place of a window and then save the result
+as an SVG or PNG file.
+"""
+
+import struct
+import zlib
+from xml.sax.saxutils import escape
+
+#Tk colour names used by the grapher, as (red, green, blue)
+colour_names = {
+    'white': (255, 255, 255),
+    'black': (0, 0, 0),
+    'red': (255, 0, 0),
+    'green': (0, 255, 0),
+    'blue': (0, 0, 255),
+    'grey': (190, 190, 190),
+    'gray': (190, 190, 190),
+    'yellow': (255, 255, 0),
+    'orange': (255, 165, 0),
+    'purple': (160, 32, 240)
+    }
+
+def parse_colour(colour):
+    """Converts a colour name or hexcode into red, green and blue values.
+
+    Parameters:
+        colour (str): A name from colour_names, or a hexcode like '#D3D3D3' or '#FFF'.
+
+    Returns:
+        (int, int, int): The red, green and blue values from 0 to 255.
+
+    Raises:
+        ValueError: If the colour is not recognised.
+    """
+
+    if colour.lower() in colour_names:
+        return colour_names[colour.lower()]
+
+    digits = colour[1:]
+    if colour.startswith('#') and len(digits) in (3, 6):
+        if len(digits) == 3:
+            digits = ''.join(d * 2 for d in digits)
+        try:
+            return tuple(int(digits[i:i+2], 16) for i in (0, 2, 4))
+        except ValueError:
+            pass
+
+    raise ValueError('Unknown colour: {colour}'.format(colour=colour))
+
+
+class HeadlessCanvas:
+    """A canvas that keeps its lines in memory instead of showing them.
+
+        It cannot be saved itself; SVGCanvas and RasterCanvas add save for their formats.
+
+        Attributes:
+            height (int): The height of the canvas.
+            width (int): The width of the canvas.
+            bg (str): The background colour.
+            items (dict): The points and options of each line, in drawing order, by ID.
+    """
+
+    def __init__(self, height, width, bg='white'):
+        self.height = height
+        self.width = width
+        self.bg = bg
+        self.items = {}
+        self.next_id = 1
+
+    def create_line(self, *points, fill='black', width=1):
+        """Adds a line through a sequence of points.
+
+        Parameters:
+            points: The x and y values of each point, either as separate arguments or one list.
+            fill (str): The colour of the line.
+            width (int/float): The width of the line in pixels.
+
+        Returns:
+            int: The ID of the line.
+        """
+
+        item = self.next_id
+        self.next_id += 1
+        self.items[item] = [_flatten(points), {'fill': fill, 'width': width}]
+        return item
+
+    def coords(self, item, *points):
+        """Returns or replaces the points of a line.
+
+        Parameters:
+            item (int): The ID of the line.
+            points: The new x and y values, if they should be replaced.
+
+        Returns:
+            [int/float]: The x and y values of the line.
+        """
+
+        if points:
+            self.items[item][0] = _flatten(points)
+        return self.items[item][0]
+
+    def itemconfigure(self, item, **options):
+        """Changes the options (e.g. fill) of a line.
+
+        Parameters:
+            item (int): The ID of the line.
+        """
+
+        self.items[item][1].update(options)
+
+    def delete(self, *items):
+        """Removes lines from the canvas.
+
+        Parameters:
+            items: The IDs of the lines, or 'all'.
+        """
+
+        for item in items:
+            if item == 'all':
+                self.items.clear()
+            else:
+                self.items.pop(item, None)
+
+    def tag_lower(self, item):
+        """Moves a line behind every other line.
+
+        Parameters:
+            item (int): The ID of the line.
+        """
+
+        self.items = dict([(item, self.items[item])] + [(i, v) for i, v in self.items.items() if i != item])
+
+    def pack(self):
+        pass
+
+    def bind(self, sequence, function):
+        pass
+
+
+class SVGCanvas(HeadlessCanvas):
+    """A headless canvas that saves its lines as an SVG image."""
+
+    def write(self, stream):
+        """Writes the SVG one line at a time to a text stream.
+
+        Parameters:
+            stream (file): The stream to write to.
+        """
+
+        stream.write('<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">\n'.format(
+            w=self.width, h=self.height))
+        stream.write('<rect width="100%" height="100%" fill="{bg}"/>\n'.format(bg=escape(self.bg)))
+
+        for points, options in self.items.values():
+            stream.write('<polyline points="')
+            stream.write(' '.join('{x:g},{y:g}'.format(x=points[i], y=points[i+1]) for i in range(0, len(points) - 1, 2)))
+            stream.write('" fill="none" stroke="{fill}" stroke-width="{width}"/>\n'.format(
+                fill=escape(options['fill']), width=options['width']))
+
+        stream.write('</svg>\n')
+
+    def save(self, path):
+        """Writes the canvas to an SVG file.
+
+        Parameters:
+            path (str): The location of the file.
+        """
+
+        with open(path, 'w') as stream:
+            self.write(stream)
+
+
+class RasterCanvas(HeadlessCanvas):
+    """A headless canvas that draws its lines into pixels and saves them as a PNG image."""
+
+    def render(self):
+        """Draws every line into an image.
+
+        Returns:
+            bytearray: The red, green and blue values of each pixel, row by row from the top.
+        """
+
+        pixels = bytearray(parse_colour(self.bg)) * (self.width * self.height)
+
+        for points, options in self.items.values():
+            colour = bytes(parse_colour(options['fill']))
+            for i in range(0, len(points) - 3, 2):
+                self.draw_segment(pixels, colour, points[i], points[i+1], points[i+2], points[i+3])
+
+        return pixels
+
+    def draw_segment(self, pixels, colour, x0, y0, x1, y1):
+        """Draws a one pixel wide straight line using Bresenham's algorithm.
+
+        Parameters:
+            pixels (bytearray): The image to draw into.
+            colour (bytes): The red, green and blue values of the line.
+            x0, y0, x1, y1 (int/float): The canvas positions of the ends of the line.
+        """
+
+        x0, y0, x1, y1 = round(x0), round(y0), round(x1), round(y1)
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        error = dx + dy
+        width = self.width
+        height = self.height
+
+        while True:
+            if 0 <= x0 < width and 0 <= y0 < height:
+                offset = 3 * (y0 * width + x0)
+                pixels[offset:offset+3] = colour
+            if x0 == x1 and y0 == y1:
+                return
+            e2 = 2 * error
+            if e2 >= dy:
+                error += dy
+                x0 += sx
+            if e2 <= dx:
+                error += dx
+                y0 += sy
+
+    def write(self, stream):
+        """Writes the image as a PNG to a binary stream.
+
+        Parameters:
+            stream (file): The stream to write to.
+        """
+
+        pixels = self.render()
+        row_size = 3 * self.width
+        compressor = zlib.compressobj()
+
+        #Each row starts with filter type 0 (none)
+        data = []
+        for row in range(self.height):
+            data.append(compressor.compress(b'\x00' + pixels[row * row_size:(row + 1) * row_size]))
+        data.append(compressor.flush())
+
+        stream.write(b'\x89PNG\r\n\x1a\n')
+        _write_chunk(stream, b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0))
+        _write_chunk(stream, b'IDAT', b''.join(data))
+        _write_chunk(stream, b'IEND', b'')
+
+    def save(self, path):
+        """Writes the canvas to a PNG file.
+
+        Parameters:
+            path (str): The location of the file.
+        """
+
+        with open(path, 'wb') as stream:
+            self.write(stream)
+
+
+def canvas_for(path, height, width):
+    """Creates a headless canvas that can save to a file with the given extension.
+
+    Parameters:
+        path (str): The file the canvas will be saved to, ending in .svg or .png.
+        height (int): The height of the canvas.
+        width (int): The width of the canvas.
+
+    Returns:
+        HeadlessCanvas: An SVGCanvas or RasterCanvas.
+
+    Raises:
+        ValueError: If the extension is not .svg or .png.
+    """
+
+    if path.lower().endswith('.svg'):
+        return SVGCanvas(height, width)
+    if path.lower().endswith('.png'):
+        return RasterCanvas(height, width)
+    raise ValueError('Cannot save to {path}, expected .svg or .png'.format(path=path))
+
+def _flatten(points):
+    if len(points) == 1 and not isinstance(points[0], (int, float)):
+        return list(points[0])
+    return list(points)
+
+def _write_chunk(stream, kind, data):
+    stream.write(struct.pack('>I', len(data)))
+    stream.write(kind)
+    stream.write(data)
+    stream.write(struct.pack('>I', zlib.crc32(kind + data)))
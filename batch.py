@@ -0,0 +1,210 @@
+"""
+Batch rendering of graphs to image files
+
+Reads jobs from a JSON Lines file, one graph per line, and renders them
+across a pool of processes without opening any windows. Each job looks
+like:
+
+    {"output": "cubic.png", "functions": [{"terms": [{"power": [1, 3]}]}],
+     "width": 800, "height": 600, "scale": [20, 10]}
+
+A term is a number (a Constant) or {"power": [a, b]} where a and b are
+terms. A function can also be given as text, e.g. "3x^2 + x^(-1) + 5".
+Only "output" and "functions" are required. A report line is
+written for every job as soon as its chunk finishes.
+
+Usage: python batch.py jobs.jsonl [--workers N] [--chunk-size N] [--output-dir DIR] [--report FILE]
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functions import *
+from grapher import Graph, FunctionLine
+from backends import canvas_for
+from parsing import parse
+
+
+def term_from_spec(spec):
+    """Builds a term from its JSON description.
+
+    Parameters:
+        spec (int/float or dict): A number for a Constant, or {"power": [a, b]} for a Power.
+
+    Returns:
+        Term: The term.
+
+    Raises:
+        ValueError: If the description is not recognised.
+    """
+
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return Constant(spec)
+    if isinstance(spec, dict) and 'power' in spec and len(spec['power']) == 2:
+        return Power(term_from_spec(spec['power'][0]), term_from_spec(spec['power'][1]))
+    raise ValueError('Invalid term: {spec}'.format(spec=json.dumps(spec)))
+
+def function_from_spec(spec):
+    """Builds a function from its JSON description.
+
+    Parameters:
+        spec (dict or str): {"terms": [...], "name": "x"}, where name is optional,
+            or the text of the function.
+
+    Returns:
+        Function: The function.
+
+    Raises:
+        ValueError: If the description is not recognised.
+    """
+
+    if isinstance(spec, str):
+        return parse(spec)
+    if not isinstance(spec, dict) or not isinstance(spec.get('terms'), list):
+        raise ValueError('Invalid function: {spec}'.format(spec=json.dumps(spec)))
+
+    f = Function([term_from_spec(term) for term in spec['terms']])
+    f.set_name(spec.get('name', 'x'))
+    return f
+
+def render_job(job, output_dir='.'):
+    """Renders one graph and saves it.
+
+    Parameters:
+        job (dict): The description of the graph.
+        output_dir (str): The directory that relative output paths are in.
+
+    Returns:
+        str: The location of the saved image.
+    """
+
+    height = job.get('height', 600)
+    width = job.get('width', 800)
+    output = os.path.join(output_dir, job['output'])
+
+    graph = Graph(None, height, width, canvas_for(output, height, width))
+    if 'scale' in job:
+        graph.scale = tuple(job['scale'])
+    if 'centre' in job:
+        graph.centre = tuple(job['centre'])
+
+    if job.get('grid', True):
+        graph.add_grid_lines()
+    if job.get('axes', True):
+        graph.add_axes()
+
+    for spec in job['functions']:
+        line = FunctionLine(function_from_spec(spec))
+        if 'no_sublines' in job:
+            line.no_sublines = job['no_sublines']
+        graph.add_line(line, spec.get('colour') if isinstance(spec, dict) else None)
+
+    graph.plot()
+    graph.get_canvas().save(output)
+    return output
+
+def render_chunk(chunk, output_dir='.'):
+    """Renders a group of jobs in a worker process.
+
+    Parameters:
+        chunk ([(int, str)]): The line number and text of each job.
+        output_dir (str): The directory that relative output paths are in.
+
+    Returns:
+        [dict]: A report for each job with its line number, output and any error.
+    """
+
+    results = []
+    for number, text in chunk:
+        try:
+            output = render_job(json.loads(text), output_dir)
+            results.append({'job': number, 'output': output, 'error': None})
+        except Exception as error:
+            results.append({'job': number, 'output': None,
+                            'error': '{kind}: {error}'.format(kind=type(error).__name__, error=error)})
+    return results
+
+def read_chunks(stream, chunk_size):
+    """Reads jobs from a stream in groups, skipping blank lines.
+
+    Parameters:
+        stream (file): The JSON Lines input.
+        chunk_size (int): The number of jobs in each group.
+
+    Yields:
+        [(int, str)]: The line number and text of each job in the group.
+    """
+
+    chunk = []
+    for number, text in enumerate(stream, 1):
+        if text.strip():
+            chunk.append((number, text))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(stream, report, workers=None, chunk_size=16, output_dir='.'):
+    """Renders every job from a stream across a pool of processes.
+
+    At most two chunks per worker are in progress at once, so the input is read
+    as it is needed rather than all at once.
+
+    Parameters:
+        stream (file): The JSON Lines input.
+        report (file): Where a JSON line is written for each finished job.
+        workers (int): The number of processes (default is the number of CPUs).
+        chunk_size (int): The number of jobs sent to a process at a time.
+        output_dir (str): The directory that relative output paths are in.
+
+    Returns:
+        (int, int): The number of jobs that succeeded and failed.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    succeeded = failed = 0
+    chunks = read_chunks(stream, chunk_size)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.add(executor.submit(render_chunk, chunk, output_dir))
+
+            if not pending:
+                return succeeded, failed
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    if result['error'] is None:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    report.write(json.dumps(result) + '\n')
+            report.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render graphs described in a JSON Lines file.')
+    parser.add_argument('jobs', help='the JSON Lines file of jobs')
+    parser.add_argument('--workers', type=int, default=None, help='the number of processes')
+    parser.add_argument('--chunk-size', type=int, default=16, help='the number of jobs per task')
+    parser.add_argument('--output-dir', default='.', help='the directory for relative output paths')
+    parser.add_argument('--report', default=None, help='where to write the report (default is stdout)')
+    args = parser.parse_args()
+
+    report = open(args.report, 'w') if args.report else sys.stdout
+    with open(args.jobs) as stream:
+        succeeded, failed = run_batch(stream, report, args.workers, args.chunk_size, args.output_dir)
+    if report is not sys.stdout:
+        report.close()
+
+    print('{s} succeeded, {f} failed'.format(s=succeeded, f=failed), file=sys.stderr)
+    sys.exit(1 if failed else 0)
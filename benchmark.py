@@ -0,0 +1,250 @@
+"""
+Performance benchmarks for evaluating, sampling and drawing functions
+
+Times each stage of plotting for a set of representative functions and
+sample counts, drawing onto a headless canvas so no display is needed.
+Every case records the best wall time over several repeats, the peak
+memory allocated while it runs (from tracemalloc) and how many items it
+left on the canvas.
+
+Results are written as JSON and can be compared against a stored
+baseline, which reports any case that became slower, used more memory
+or drew a different number of items.
+
+Usage: python benchmark.py [--output FILE] [--baseline FILE] [--threshold RATIO] [--repeat N] [--quick]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from math import isfinite
+from functions import *
+from grapher import Graph, FunctionLine, example_functions
+from backends import HeadlessCanvas
+
+FORMAT_VERSION = 1
+
+
+def benchmark_functions():
+    """Returns the functions that are benchmarked, by name.
+
+    These are the grapher's examples, high degree polynomials and functions
+    that are undefined over most of the graph.
+
+    Returns:
+        [(str, Function)]: The name and function of each case.
+    """
+
+    functions = [('example{n}'.format(n=n), f) for n, f in enumerate(example_functions(), 1)]
+
+    dense = Function([Power(Constant(n + 1), Constant(n)) for n in range(1, 13)] + [Constant(1)])
+    sparse = Function([Power(Constant(1), Constant(1000)), Power(Constant(-2), Constant(257)), Constant(1)])
+    functions.append(('dense_degree12', dense))
+    functions.append(('sparse_degree1000', sparse))
+
+    #Only defined for a sliver of the visible range
+    functions.append(('mostly_undefined_root', Function([Power(Constant(1), Constant(0.5)), Power(Constant(1), Constant(-0.5))])))
+    functions.append(('mostly_undefined_nested', Function([Power(Constant(1), Power(Constant(1), Constant(0.5)))])))
+    return functions
+
+def headless_graph(height=600, width=800):
+    """Creates a graph that draws onto a headless canvas.
+
+    Parameters:
+        height (int): The height of the canvas.
+        width (int): The width of the canvas.
+
+    Returns:
+        Graph: The graph.
+    """
+    return Graph(None, height, width, HeadlessCanvas(height, width))
+
+def measure(run, setup=None, repeat=5):
+    """Times a benchmark case and measures its peak memory.
+
+    Parameters:
+        run (callable): Performs the work being measured, given the result of setup.
+        setup (callable): Prepares fresh state for each run, and is not measured.
+        repeat (int): How many times to time the run, keeping the fastest.
+
+    Returns:
+        dict: The fastest time in seconds and the peak bytes allocated during one run.
+    """
+
+    seconds = None
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+
+    #Tracing slows everything down, so memory is measured in a separate run
+    state = setup() if setup is not None else None
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': seconds, 'peak_bytes': peak}
+
+def run_benchmarks(sample_counts=(100, 1000, 10000), repeat=5, functions=None):
+    """Runs every benchmark case.
+
+    Parameters:
+        sample_counts ([int]): The numbers of steps each line is sampled with.
+        repeat (int): How many times each case is timed.
+        functions ([(str, Function)]): The functions to use (default is benchmark_functions()).
+
+    Returns:
+        [dict]: The name, time, peak memory and canvas item count of each case.
+    """
+
+    if functions is None:
+        functions = benchmark_functions()
+    results = []
+
+    def record(name, run, setup=None, items=None):
+        result = measure(run, setup, repeat)
+        result['name'] = name
+        result['items'] = items() if items is not None else None
+        results.append(result)
+
+    for label, function in functions:
+        xs = [x / 8 for x in range(-800, 801)]
+
+        def evaluate(state, function=function, xs=xs):
+            for x in xs:
+                try:
+                    function.calculate_value(x)
+                except Exception:
+                    pass
+
+        record('calculate_value/{f}'.format(f=label), evaluate)
+        record('evaluate_many/{f}'.format(f=label), lambda state, function=function, xs=xs: function.evaluate_many(xs))
+
+        for count in sample_counts:
+            graph = headless_graph()
+            x_min, y_min, x_max, y_max = graph.get_viewport()
+
+            def new_line(function=function, count=count):
+                line = FunctionLine(function)
+                line.cache = None
+                line.no_sublines = count
+                return line
+
+            def sampled_line(new_line=new_line):
+                line = new_line()
+                line.generate_coordinates(x_min, x_max, graph.scale, (y_min, y_max))
+                graph.canvas.delete('all')
+                return line
+
+            record('generate_coordinates/{f}/{n}'.format(f=label, n=count),
+                   lambda line: line.generate_coordinates(x_min, x_max, graph.scale, (y_min, y_max)), new_line)
+            record('draw_sublines/{f}/{n}'.format(f=label, n=count),
+                   lambda line, graph=graph: line.draw_sublines(graph, x_min, y_min, x_max, y_max), sampled_line,
+                   lambda graph=graph: len(graph.canvas.items))
+            #convert_coordinate only accepts finite coordinates
+            record('convert_coordinate/{f}/{n}'.format(f=label, n=count),
+                   lambda line, graph=graph: [graph.convert_coordinate(c) for c in line.coordinates
+                                              if c.get_y() is None or isfinite(c.get_y())], sampled_line)
+            record('convert_coordinates/{f}/{n}'.format(f=label, n=count),
+                   lambda line, graph=graph: graph.convert_coordinates(line.coordinates), sampled_line)
+
+    def grid_graph():
+        graph = headless_graph()
+        graph.add_grid_lines()
+        graph.add_axes()
+        return graph
+
+    record('plot_grid', lambda graph: graph.plot(), grid_graph, lambda: _plotted_items(grid_graph()))
+
+    return results
+
+def compare(results, baseline, threshold=1.25):
+    """Finds cases that have regressed since a baseline.
+
+    Parameters:
+        results ([dict]): The current results.
+        baseline ([dict]): The results to compare with.
+        threshold (int/float): How many times slower or larger a case may be before it is reported.
+
+    Returns:
+        [str]: A description of each regression.
+    """
+
+    previous = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+
+        for measurement in ('seconds', 'peak_bytes'):
+            if old[measurement] and result[measurement] > old[measurement] * threshold:
+                regressions.append('{name}: {m} {old:g} -> {new:g} ({ratio:.2f}x)'.format(
+                    name=result['name'], m=measurement, old=old[measurement], new=result[measurement],
+                    ratio=result[measurement] / old[measurement]))
+        if old.get('items') != result.get('items'):
+            regressions.append('{name}: items {old} -> {new}'.format(name=result['name'], old=old.get('items'), new=result.get('items')))
+
+    return regressions
+
+def report(results):
+    """Wraps results with details of where they were measured.
+
+    Parameters:
+        results ([dict]): The results of run_benchmarks.
+
+    Returns:
+        dict: The JSON document that is written out.
+    """
+
+    return {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+        }
+
+def _plotted_items(graph):
+    graph.plot()
+    return len(graph.canvas.items)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark evaluating, sampling and drawing functions.')
+    parser.add_argument('--output', default=None, help='where to write the JSON results (default is stdout)')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='the slowdown ratio reported as a regression')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times each case is timed')
+    parser.add_argument('--quick', action='store_true', help='only sample 100 and 1000 steps')
+    args = parser.parse_args()
+
+    sample_counts = (100, 1000) if args.quick else (100, 1000, 10000)
+    document = report(run_benchmarks(sample_counts, args.repeat))
+
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(document, stream, indent=1)
+    else:
+        json.dump(document, sys.stdout, indent=1)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        if baseline.get('version') != FORMAT_VERSION:
+            print('Baseline was written by a different version of the benchmarks', file=sys.stderr)
+            sys.exit(2)
+
+        regressions = compare(document['results'], baseline['results'], args.threshold)
+        for regression in regressions:
+            print('Regression: ' + regression, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,91 @@
+"""
+Streaming export of function values as tables
+
+Writes x and f(x) at equally spaced x values as CSV or TSV, one row per
+value. Values are generated and written a chunk at a time with
+Function.iter_values, so memory use does not grow with the number of
+rows. Where f(x) is undefined (or not finite, which the grapher does not
+draw either) the f(x) field is left empty.
+
+Usage: python export.py FUNCTION A B STEPS [--output FILE] [--tsv] [--chunk N] [--no-header]
+"""
+
+import argparse
+import sys
+from math import isfinite
+from parsing import parse
+
+DEFAULT_CHUNK = 65536
+
+
+def write_table(function, a, b, no_steps, stream, delimiter=',', header=True, chunk=DEFAULT_CHUNK):
+    """Writes the values of a function to a stream as a table.
+
+    Parameters:
+        function (Function): The function to be evaluated.
+        a (int/float): The first x value.
+        b (int/float): The last x value.
+        no_steps (int): The number of steps between a and b, giving no_steps + 1 rows.
+        stream (file): Where the text is written.
+        delimiter (str): What separates the x and f(x) fields, ',' for CSV or '\\t' for TSV.
+        header (bool): If the first row names the columns.
+        chunk (int): How many rows are generated and written at once.
+
+    Returns:
+        int: The number of rows of values written.
+    """
+
+    if header:
+        stream.write('{x}{d}f({x})\n'.format(x=function.name, d=delimiter))
+
+    rows = 0
+    for xs, ys in function.iter_values(a, b, no_steps, chunk):
+        stream.write(''.join(
+            '{x!r}{d}{y!r}\n'.format(x=x, d=delimiter, y=y) if isfinite(y) else '{x!r}{d}\n'.format(x=x, d=delimiter)
+            for x, y in zip(xs, ys)
+            ))
+        rows += len(xs)
+    return rows
+
+def export(function, a, b, no_steps, path, delimiter=None, header=True, chunk=DEFAULT_CHUNK):
+    """Saves the values of a function as a CSV or TSV file.
+
+    Parameters:
+        function (Function): The function to be evaluated.
+        a (int/float): The first x value.
+        b (int/float): The last x value.
+        no_steps (int): The number of steps between a and b, giving no_steps + 1 rows.
+        path (str): The location of the file.
+        delimiter (str): What separates the fields (default is a tab for .tsv files,
+            otherwise a comma).
+        header (bool): If the first row names the columns.
+        chunk (int): How many rows are generated and written at once.
+
+    Returns:
+        int: The number of rows of values written.
+    """
+
+    if delimiter is None:
+        delimiter = '\t' if path.lower().endswith('.tsv') else ','
+    with open(path, 'w', newline='') as stream:
+        return write_table(function, a, b, no_steps, stream, delimiter, header, chunk)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the values of a function as a CSV or TSV table.')
+    parser.add_argument('function', help="the function, e.g. '3x^2 - 1'")
+    parser.add_argument('a', type=float, help='the first x value')
+    parser.add_argument('b', type=float, help='the last x value')
+    parser.add_argument('steps', type=int, help='the number of steps between a and b')
+    parser.add_argument('--output', default=None, help='where to write the table (default is stdout)')
+    parser.add_argument('--tsv', action='store_true', help='separate fields with tabs rather than commas')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='how many rows are generated at once')
+    parser.add_argument('--no-header', action='store_true', help='leave out the row naming the columns')
+    args = parser.parse_args()
+
+    function = parse(args.function)
+    delimiter = '\t' if args.tsv else None
+    if args.output:
+        export(function, args.a, args.b, args.steps, args.output, delimiter, not args.no_header, args.chunk)
+    else:
+        write_table(function, args.a, args.b, args.steps, sys.stdout, delimiter or ',', not args.no_header, args.chunk)
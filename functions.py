@@ -7,6 +7,17 @@ or a power of x with a multiplicative constant
 """
 
 from abc import ABC, abstractmethod 
+from array import array
+from bisect import bisect_left, bisect_right
+from fractions import Fraction
+from math import copysign, inf, isfinite, nan, sqrt
+from weakref import WeakValueDictionary
+
+try:
+    from math import cbrt
+except ImportError:
+    #Python < 3.11
+    cbrt = None
 
 class Term(ABC):
     """Abstract class for inheritance that provides one abstract method.
@@ -20,6 +31,88 @@ class Term(ABC):
     def calculate_value(self, x):
         pass
 
+    def evaluate_many(self, xs):
+        """Evaluates the term for a sequence of x values.
+
+        Parameters:
+            xs (sequence of int/float): The x values that the term should be evaluated for.
+
+        Returns:
+            array: The values of the term as floats, NaN where the term is undefined.
+        """
+
+        values = array('d')
+        for x in xs:
+            try:
+                values.append(self.calculate_value(x))
+            except Exception:
+                values.append(nan)
+        return values
+
+    def key(self):
+        """Returns a value describing the structure of the term.
+
+        Two terms with equal keys always evaluate to the same values, so the
+        key can be used to tell when a term tree has changed. Terms that do
+        not describe their structure are only equal to themselves.
+
+        Returns:
+            tuple: A hashable description of the term.
+        """
+        return (self.__class__.__name__, self)
+
+    def domain(self):
+        """Returns the x values that the term may be defined for.
+
+        Terms that do not know their domain are assumed to be defined everywhere,
+        so the domain can include x values that still turn out to be undefined,
+        but never leaves out x values that are defined.
+
+        Returns:
+            Domain: The x values that the term may be defined for.
+        """
+        return Domain()
+
+    def freeze(self):
+        """Returns an immutable copy of the term.
+
+        Frozen terms are interned, so structurally equal frozen terms are the
+        same object and can be compared, hashed and shared by identity.
+
+        Returns:
+            Term: The frozen term.
+
+        Raises:
+            TypeError: If the term does not support freezing.
+        """
+        raise TypeError('{kind} terms cannot be frozen'.format(kind=type(self).__name__))
+
+    def thaw(self):
+        """Returns a mutable copy of the term.
+
+        Returns:
+            Term: The copy.
+        """
+        return self
+
+    def _source(self, bindings):
+        """Returns a Python expression in x that evaluates the term.
+
+        Used to compile terms and functions. Any objects the expression refers
+        to are added to bindings under the names used in the expression. The
+        expression raises a ValueError rather than giving a complex number.
+
+        Parameters:
+            bindings (dict): The names available to the compiled expression.
+
+        Returns:
+            str: The source code of the expression.
+        """
+
+        name = '_t{n}'.format(n=len(bindings))
+        bindings[name] = self
+        return '{name}.calculate_value(x)'.format(name=name)
+
 
 class Constant(Term):
     """A term in the form c that has a constant value.
@@ -44,18 +137,52 @@ class Constant(Term):
         """
         return self.value
 
+    def evaluate_many(self, xs):
+        """Evaluates the constant for a sequence of x values.
+
+        Parameters:
+            xs (sequence of int/float): The x values that the term should be evaluated for.
+
+        Returns:
+            array: The value of the constant repeated once for each x value.
+        """
+        return array('d', [self.value]) * len(xs)
+
+    def key(self):
+        return ('Constant', repr(self.value))
+
+    def freeze(self):
+        return _intern(('Constant', repr(self.value)), FrozenConstant, self.value)
+
+    def thaw(self):
+        return Constant(self.value)
+
+    def _source(self, bindings):
+        if isfinite(self.value):
+            return '({value!r})'.format(value=self.value)
+        return super()._source(bindings)
+
     def __str__(self):
         return str(self.value)
 
 class Power(Term):
     """A term in the form ax^b that can be evaluated for int or float values of x.
 
+        When b is a Constant, x^b is worked out with the cheapest exact method
+        for that exponent (e.g. x*x for 2, 1/x for -1 or sqrt(x) for 0.5). It is
+        chosen again whenever b, the value of b or real_branch is changed. Repeated multiplication gives inf rather than raising
+        an OverflowError when x^b is too large for a float.
+
         Attributes:
             a (int/float): The multiplicative term.
             b (int/float): The power which x should be raised to.
+            real_branch (bool): If a constant b that is a fraction with an odd denominator
+                (e.g. 1/3) gives the real root for negative x rather than a complex number
+                (default is False).
     """
 
     def __init__(self, a, b):
+        self.real_branch = False
         self.set_a(a)
         self.set_b(b)
 
@@ -85,6 +212,20 @@ class Power(Term):
         if not isinstance(b, Term):
             raise TypeError('b must be an instance of a Term object')
         self.b = b
+        self._specialise()
+
+    def set_real_branch(self, real_branch):
+        """Changes if odd roots of negative x give real values.
+
+        With the real branch, x^(p/q) for an odd q is the real qth root of x
+        raised to the power p, so (-8)^(1/3) is -2 and (-8)^(2/3) is 4.
+
+        Parameters:
+            real_branch (bool): If the real branch should be used.
+        """
+
+        self.real_branch = bool(real_branch)
+        self._specialise()
 
     def calculate_value(self, x):
         """Evaluates the term for a specific value of x.
@@ -96,15 +237,109 @@ class Power(Term):
             float: The value of the term when x=x.
 
         Raises:
-            ValueError: If the result is a complex number (negative number raised a fractional power).
+            ValueError: If the result is a complex number (negative number raised a fractional power,
+                unless real_branch is set and the power has an odd denominator).
         """
         
+        b = self.b
+        if b is not self._power_b or self.real_branch is not self._power_real or getattr(b, 'value', None) is not self._power_value:
+            self._specialise()
+        if self._power is not None:
+            return self.a.calculate_value(x) * self._power(x)
+
         result = self.a.calculate_value(x) * (x)**self.b.calculate_value(x)
 
         if isinstance(result, complex):
             raise ValueError('Result is a complex number: {result}'.format(result=result))
         return result
 
+    def evaluate_many(self, xs):
+        """Evaluates the term for a sequence of x values.
+
+        Follows the same rules as calculate_value, but undefined results
+        (complex numbers, division by zero, overflow) become NaN instead of
+        raising an exception, as do results that are not finite.
+
+        Parameters:
+            xs (sequence of int/float): The x values that the term should be evaluated for.
+
+        Returns:
+            array: The values of the term as floats, NaN where the term is undefined.
+        """
+
+        calculate_value = self.calculate_value
+        values = array('d')
+        append = values.append
+        for x in xs:
+            try:
+                y = calculate_value(x)
+            except Exception:
+                y = nan
+            append(y if isfinite(y) else nan)
+        return values
+
+    def _specialise(self):
+        #Picks how x is raised to a constant b, None for a general power, and
+        #remembers what it was picked for so direct assignments are noticed
+        self._power_b = self.b
+        self._power_value = getattr(self.b, 'value', None)
+        self._power_real = self.real_branch
+        if isinstance(self.b, Constant):
+            self._power = _power_function(self.b.value, self.real_branch)
+        else:
+            self._power = None
+
+    def key(self):
+        if self.real_branch:
+            return ('Power', self.a.key(), self.b.key(), 'real')
+        return ('Power', self.a.key(), self.b.key())
+
+    def freeze(self):
+        a = self.a.freeze()
+        b = self.b.freeze()
+        return _intern(('Power', a, b, self.real_branch), FrozenPower, a, b, self.real_branch)
+
+    def thaw(self):
+        term = Power(self.a.thaw(), self.b.thaw())
+        term.set_real_branch(self.real_branch)
+        return term
+
+    def domain(self):
+        """Returns the x values that the term may be defined for.
+
+        Negative powers are undefined at 0 and fractional powers are undefined
+        (complex) for negative x, except for odd roots when real_branch is set.
+        If b is not a Constant only the domains of a and b are taken into account.
+
+        Returns:
+            Domain: The x values that the term may be defined for.
+        """
+
+        domain = self.a.domain().intersect(self.b.domain())
+        if not isinstance(self.b, Constant) or not isfinite(self.b.value):
+            return domain
+
+        exponent = self.b.value
+        if exponent == int(exponent) or (self.real_branch and _odd_root(exponent) is not None):
+            if exponent < 0:
+                domain = domain.intersect(Domain([(-inf, 0, False, False), (0, inf, False, False)]))
+        elif exponent > 0:
+            domain = domain.intersect(Domain([(0, inf, True, False)]))
+        else:
+            domain = domain.intersect(Domain([(0, inf, False, False)]))
+        return domain
+
+    def _source(self, bindings):
+        sources = [self.a._source(bindings), self.b._source(bindings)]
+
+        if isinstance(self.b, Constant):
+            power = _power_source(self.b.value, self.real_branch)
+            if power is not None:
+                return '({a} * {power})'.format(a=sources[0], power=power)
+
+        #Only a general power can turn out to be complex
+        return '_real({a} * x**{b})'.format(a=sources[0], b=sources[1])
+
     def __str__(self):
         return '{a}x^({b})'.format(a=self.a, b=self.b)
 
@@ -117,9 +352,11 @@ class Function():
             name (str): The name of the variable used in the function, default is x.
     """
     
-    def __init__(self, terms=[], name='x'):
-        self.terms = terms
+    def __init__(self, terms=(), name='x'):
+        self.terms = list(terms)
         self.name = name
+        self._compiled = None
+        self._compiled_key = None
 
     def add_term(self, term):
         """Adds a term to the function.
@@ -134,6 +371,7 @@ class Function():
         if not isinstance(term, Term):
             raise TypeError('Term must be an instance of a Term object')
         self.terms.append(term)
+        self._compiled = None
 
     def remove_term(self, index):
         """Removes a term from the function.
@@ -151,6 +389,7 @@ class Function():
         if index < 0 or index >= len(self.terms):
             raise IndexError('Index {i} is out of range 0 <= i < {n}'.format(i=index, n=len(self.terms)))
         self.terms.pop(index)
+        self._compiled = None
 
     def set_name(self, name):
         """Changes the variable name of the function.
@@ -178,6 +417,27 @@ class Function():
         
         return self.name
 
+    def set_real_branch(self, real_branch):
+        """Changes if odd roots of negative x give real values for every power in the function.
+
+        Parameters:
+            real_branch (bool): If the real branch should be used (see Power.set_real_branch).
+                Frozen terms are replaced by frozen terms that use it.
+        """
+
+        self.terms = [_frozen_real_branch(t, real_branch) if isinstance(t, _Frozen) else t for t in self.terms]
+        stack = list(self.terms)
+        while stack:
+            t = stack.pop()
+            if isinstance(t, Power) and not isinstance(t, _Frozen):
+                t.set_real_branch(real_branch)
+                if isinstance(t.a, _Frozen):
+                    t.set_a(_frozen_real_branch(t.a, real_branch))
+                if isinstance(t.b, _Frozen):
+                    t.set_b(_frozen_real_branch(t.b, real_branch))
+                stack.extend((t.a, t.b))
+        self._compiled = None
+
     def calculate_value(self, x):
         """Evaluates the function for a specific value of x.
 
@@ -208,6 +468,208 @@ class Function():
 
         return result
 
+    def evaluate_many(self, xs):
+        """Evaluates the function for many values of x in one pass.
+
+        Gives the same values as calculate_value, except that x values for
+        which f(x) is undefined produce NaN rather than an exception, as do
+        values that are not finite (e.g. from overflow).
+
+        Parameters:
+            xs (iterable of int/float): The values of x that the function should be evaluated for.
+
+        Returns:
+            array: The values of f(x) as floats, NaN where f(x) is undefined.
+
+        Raises:
+            TypeError: If any x is not an int or a float.
+        """
+
+        return self.compile(batch=True)(array('d', xs))
+
+    def iter_values(self, a, b, n, chunk=65536):
+        """Evaluates the function at equally spaced x values, a chunk at a time.
+
+        Only one chunk is held in memory at once, so any number of values can be
+        generated. The x values are the same as those a line is sampled at with
+        n steps, and f(x) is NaN where it is undefined, as in evaluate_many
+        (see sample_uniform).
+
+        Parameters:
+            a (int/float): The first x value.
+            b (int/float): The last x value.
+            n (int): The number of steps between a and b, giving n + 1 values.
+            chunk (int): The most values in each chunk.
+
+        Yields:
+            (array, array): The x values and f(x) values of each chunk.
+
+        Raises:
+            ValueError: If n or chunk is not positive.
+        """
+
+        if n < 1:
+            raise ValueError('Number of steps must be positive')
+        if chunk < 1:
+            raise ValueError('Chunk size must be positive')
+
+        yield from sample_uniform(self.compile(batch=True), a, b, n, self.domain(), chunk)
+
+    def key(self):
+        """Returns a value describing the structure of the function.
+
+        Returns:
+            tuple: A hashable description of the terms, equal for functions
+            that evaluate to the same values.
+        """
+
+        return ('Function',) + tuple(t.key() for t in self.terms)
+
+    def domain(self):
+        """Returns the x values that the function may be defined for.
+
+        This is where every term may be defined, and is empty if there are no terms.
+
+        Returns:
+            Domain: The x values that the function may be defined for.
+        """
+
+        if len(self.terms) == 0:
+            return Domain([])
+
+        domain = Domain()
+        for t in self.terms:
+            domain = domain.intersect(t.domain())
+        return domain
+
+    def simplify(self):
+        """Returns an equivalent function with fewer terms.
+
+        Constant terms and x^0 terms are folded into one constant, powers of x
+        with the same constant exponent have their coefficients added, and terms
+        that are always zero are dropped. Terms of other forms are kept as they
+        are. Zero coefficients on negative or fractional powers are kept so the
+        function stays undefined wherever it was undefined before.
+
+        Returns:
+            Function: The simplified function, which has the same name.
+        """
+
+        #Each kind of term keeps the position of its first appearance
+        combined = {}
+        for t in self.terms:
+            if isinstance(t, Constant):
+                slot = ('constant',)
+                value = t.value
+            elif isinstance(t, Power) and isinstance(t.a, Constant) and isinstance(t.b, Constant):
+                if t.b.value == 0:
+                    slot = ('constant',)
+                else:
+                    slot = ('power', t.b.value, t.real_branch)
+                value = t.a.value
+            else:
+                combined[('other', len(combined))] = t
+                continue
+
+            if slot in combined:
+                combined[slot][0] += value
+            else:
+                combined[slot] = [value, t]
+
+        terms = []
+        for slot, entry in combined.items():
+            if slot[0] == 'other':
+                terms.append(entry)
+            elif slot[0] == 'constant':
+                if entry[0] != 0:
+                    terms.append(Constant(entry[0]))
+            else:
+                exponent = entry[1].b
+                if entry[0] != 0 or not (exponent.value > 0 and exponent.value == int(exponent.value)):
+                    term = Power(Constant(entry[0]), Constant(exponent.value))
+                    term.set_real_branch(entry[1].real_branch)
+                    terms.append(term)
+
+        #Everything cancelled out
+        if len(terms) == 0 and len(self.terms) > 0:
+            terms.append(Constant(0))
+
+        return Function(terms, self.name)
+
+    def freeze(self):
+        """Returns an immutable copy of the function with frozen terms.
+
+        Frozen functions are interned like frozen terms (see Term.freeze).
+
+        Returns:
+            FrozenFunction: The frozen function.
+        """
+
+        terms = tuple(t.freeze() for t in self.terms)
+        return _intern(('Function', self.name, terms), FrozenFunction, terms, self.name)
+
+    def thaw(self):
+        """Returns a mutable copy of the function.
+
+        Returns:
+            Function: The copy, with mutable copies of the terms.
+        """
+        return Function([t.thaw() for t in self.terms], self.name)
+
+    def as_polynomial(self):
+        """Converts the function into a polynomial, if it is one.
+
+        Returns:
+            Polynomial: The polynomial, or None if any term is not a constant
+            or a constant multiple of a non-negative integer power of x.
+        """
+
+        if len(self.terms) == 0:
+            return None
+
+        coefficients = {}
+        for t in self.terms:
+            if isinstance(t, Constant):
+                degree = 0
+                coefficient = t.value
+            elif (isinstance(t, Power) and isinstance(t.a, Constant) and isinstance(t.b, Constant)
+                  and type(t.b.value) is int and t.b.value >= 0):
+                degree = t.b.value
+                coefficient = t.a.value
+            else:
+                return None
+
+            if not isfinite(coefficient):
+                return None
+            coefficients[degree] = coefficients.get(degree, 0) + coefficient
+
+        return Polynomial(coefficients)
+
+    def compile(self, batch=False):
+        """Generates a single callable that evaluates the function.
+
+        The term tree is written out as one Python expression with the
+        constants inlined, so each evaluation avoids calling calculate_value
+        for every term. Polynomials are evaluated in their canonical form
+        instead (see Polynomial). The compiled form is reused until the terms
+        change.
+
+        Parameters:
+            batch (bool): If the callable should evaluate a sequence of x values at once.
+
+        Returns:
+            callable: Takes x and returns f(x), raising the same exceptions as
+            calculate_value when f(x) is undefined. x is not type checked.
+            If batch is set, it instead takes a sequence of x values and
+            returns an array with NaN where f(x) is undefined or not finite.
+        """
+
+        key = self.key()
+        if self._compiled is None or self._compiled_key != key:
+            self._compiled = _compile_terms(self.terms, self.name)
+            self._compiled_key = key
+        return self._compiled[1] if batch else self._compiled[0]
+
     def __str__(self):
         if len(self.terms) == 0:
             return 'f({name}) = undefined'.format(name=self.name)
@@ -216,6 +678,687 @@ class Function():
             name=self.name, terms=' + '.join(str(term) for term in self.terms)
             )
 
-    
 
+class _Frozen:
+    """Mixin that stops the public attributes of a term being changed after it is created."""
+
+    def __setattr__(self, name, value):
+        #Private attributes only cache values derived from the public ones
+        if not name.startswith('_'):
+            raise AttributeError('{kind} is immutable, {name} cannot be changed'.format(kind=type(self).__name__, name=name))
+        object.__setattr__(self, name, value)
+
+    def freeze(self):
+        return self
+
+
+class FrozenConstant(_Frozen, Constant):
+    """An immutable Constant, created with Constant.freeze."""
+
+    def __init__(self, value):
+        object.__setattr__(self, 'value', value)
+        self._key = ('Constant', repr(value))
+
+    def key(self):
+        return self._key
+
+    def with_value(self, value):
+        """Returns a frozen constant with a different value.
+
+        Parameters:
+            value (int/float): The new value.
+
+        Returns:
+            FrozenConstant: The constant.
+        """
+        return Constant(value).freeze()
+
+
+class FrozenPower(_Frozen, Power):
+    """An immutable Power with frozen a and b, created with Power.freeze."""
+
+    def __init__(self, a, b, real_branch=False):
+        object.__setattr__(self, 'a', a)
+        object.__setattr__(self, 'b', b)
+        object.__setattr__(self, 'real_branch', real_branch)
+        self._specialise()
+        if real_branch:
+            self._key = ('Power', a.key(), b.key(), 'real')
+        else:
+            self._key = ('Power', a.key(), b.key())
+
+    def set_a(self, a):
+        raise AttributeError('FrozenPower is immutable, use with_a instead')
+
+    def set_b(self, b):
+        raise AttributeError('FrozenPower is immutable, use with_b instead')
+
+    def set_real_branch(self, real_branch):
+        raise AttributeError('FrozenPower is immutable, use with_real_branch instead')
+
+    def key(self):
+        return self._key
+
+    def with_a(self, a):
+        """Returns a frozen power with a different multiplicative term.
+
+        Parameters:
+            a (Term): The new multiplicative term, which is frozen if it is not already.
+
+        Returns:
+            FrozenPower: The power.
+        """
+
+        a = a.freeze()
+        return _intern(('Power', a, self.b, self.real_branch), FrozenPower, a, self.b, self.real_branch)
+
+    def with_b(self, b):
+        """Returns a frozen power with a different power term.
+
+        Parameters:
+            b (Term): The new power term, which is frozen if it is not already.
+
+        Returns:
+            FrozenPower: The power.
+        """
+
+        b = b.freeze()
+        return _intern(('Power', self.a, b, self.real_branch), FrozenPower, self.a, b, self.real_branch)
+
+    def with_real_branch(self, real_branch):
+        """Returns a frozen power that does or does not use the real branch.
+
+        Parameters:
+            real_branch (bool): If the real branch should be used (see Power.set_real_branch).
+
+        Returns:
+            FrozenPower: The power.
+        """
+
+        real_branch = bool(real_branch)
+        return _intern(('Power', self.a, self.b, real_branch), FrozenPower, self.a, self.b, real_branch)
+
+
+class FrozenFunction(_Frozen, Function):
+    """An immutable Function with a tuple of frozen terms, created with Function.freeze.
+
+        Because it is interned and cannot change, a frozen function can itself be used
+        as a cache key.
+    """
+
+    def __init__(self, terms, name='x'):
+        object.__setattr__(self, 'terms', terms)
+        object.__setattr__(self, 'name', name)
+        self._compiled = None
+        self._compiled_key = None
+        self._key = ('Function',) + tuple(t.key() for t in terms)
+
+    def add_term(self, term):
+        raise AttributeError('FrozenFunction is immutable, use with_term instead')
+
+    def remove_term(self, index):
+        raise AttributeError('FrozenFunction is immutable, use without_term instead')
+
+    def set_name(self, name):
+        raise AttributeError('FrozenFunction is immutable, use with_name instead')
+
+    def set_real_branch(self, real_branch):
+        raise AttributeError('FrozenFunction is immutable, freeze a changed copy instead')
+
+    def key(self):
+        return self._key
+
+    def with_term(self, term):
+        """Returns a frozen function with an extra term at the end.
+
+        Parameters:
+            term (Term): The term to be added, which is frozen if it is not already.
+
+        Returns:
+            FrozenFunction: The function.
+
+        Raises:
+            TypeError: If the term is not a Term object.
+        """
+
+        if not isinstance(term, Term):
+            raise TypeError('Term must be an instance of a Term object')
+        terms = self.terms + (term.freeze(),)
+        return _intern(('Function', self.name, terms), FrozenFunction, terms, self.name)
+
+    def without_term(self, index):
+        """Returns a frozen function without one of the terms.
+
+        Parameters:
+            index (int): The position of the term to be removed.
+
+        Returns:
+            FrozenFunction: The function.
+
+        Raises:
+            TypeError: If the index is not an integer.
+            IndexError: If the index is not in range.
+        """
+
+        if not isinstance(index, int):
+            raise TypeError('Index must be an integer')
+        if index < 0 or index >= len(self.terms):
+            raise IndexError('Index {i} is out of range 0 <= i < {n}'.format(i=index, n=len(self.terms)))
+        terms = self.terms[:index] + self.terms[index + 1:]
+        return _intern(('Function', self.name, terms), FrozenFunction, terms, self.name)
+
+    def with_name(self, name):
+        """Returns a frozen function with a different variable name.
+
+        Parameters:
+            name (str): The new variable name (must be one character long).
+
+        Returns:
+            FrozenFunction: The function.
+
+        Raises:
+            TypeError: If name is not a str.
+            ValueError: If the str is longer than one character.
+        """
+
+        if not isinstance(name, str):
+            raise TypeError('Variable name must be a string')
+        if len(name) != 1:
+            raise ValueError('Variable name must only be one character')
+        return _intern(('Function', name, self.terms), FrozenFunction, self.terms, name)
+
+
+#Every frozen term and function that is still in use, by its structure
+_interned = WeakValueDictionary()
+
+def _intern(key, kind, *args):
+    """Returns the frozen object with a given structure, creating it if there is none.
+
+    Parameters:
+        key (tuple): The structure, made of values and other interned objects.
+        kind (type): The frozen class.
+        args: The arguments used to create the object if needed.
+
+    Returns:
+        The interned object.
+    """
+
+    node = _interned.get(key)
+    if node is None:
+        node = _interned.setdefault(key, kind(*args))
+    return node
+
+def _frozen_real_branch(term, real_branch):
+    """Returns a frozen term with real_branch set on every power in it.
+
+    Parameters:
+        term (Term): The frozen term.
+        real_branch (bool): If the real branch should be used.
+
+    Returns:
+        Term: The frozen term, which is the same term if it has no powers.
+    """
+
+    if not isinstance(term, Power):
+        return term
+    a = _frozen_real_branch(term.a, real_branch)
+    b = _frozen_real_branch(term.b, real_branch)
+    real_branch = bool(real_branch)
+    return _intern(('Power', a, b, real_branch), FrozenPower, a, b, real_branch)
+
+
+class Domain():
+    """A set of x values made of separate intervals.
+
+        Attributes:
+            intervals ([(int/float, int/float, bool, bool)]): The lower and upper bound of each
+                interval in increasing order, and if each bound is included. The default is
+                every real number.
+    """
+
+    def __init__(self, intervals=None):
+        if intervals is None:
+            intervals = [(-inf, inf, False, False)]
+        self.intervals = sorted(intervals)
+        self._lowers = [interval[0] for interval in self.intervals]
+
+    def contains(self, x):
+        """Indicates if an x value is in the domain.
+
+        Parameters:
+            x (int/float): The x value.
+
+        Returns:
+            bool: If x is in one of the intervals.
+        """
+
+        #Only the last interval starting at or before x, or the one before it
+        #if that starts exactly at x, can contain x
+        i = bisect_right(self._lowers, x)
+        for lower, upper, lower_closed, upper_closed in self.intervals[max(i - 2, 0):i]:
+            if (lower < x or (lower_closed and lower == x)) and (x < upper or (upper_closed and x == upper)):
+                return True
+        return False
+
+    def contains_range(self, a, b):
+        """Indicates if every x value between two others is in the domain.
+
+        Parameters:
+            a (int/float): One end of the range.
+            b (int/float): The other end of the range.
+
+        Returns:
+            bool: If one interval contains both a and b, so there is no gap between them.
+        """
+
+        if b < a:
+            a, b = b, a
+        i = bisect_right(self._lowers, a)
+        for lower, upper, lower_closed, upper_closed in self.intervals[max(i - 2, 0):i]:
+            if (lower < a or (lower_closed and lower == a)) and (b < upper or (upper_closed and b == upper)):
+                return True
+        return False
+
+    def index_ranges(self, xs):
+        """Finds which of a sorted sequence of x values are in the domain.
+
+        Parameters:
+            xs (sequence of int/float): The x values in increasing order.
+
+        Returns:
+            [(int, int)]: The start and end index of each run of x values in the
+            domain, in increasing order.
+        """
+
+        ranges = []
+        for lower, upper, lower_closed, upper_closed in self.intervals:
+            start = (bisect_left if lower_closed else bisect_right)(xs, lower)
+            end = (bisect_right if upper_closed else bisect_left)(xs, upper)
+            if start < end:
+                ranges.append((start, end))
+        return ranges
+
+    def intersect(self, other):
+        """Finds the x values that are in both domains.
+
+        Parameters:
+            other (Domain): The other domain.
+
+        Returns:
+            Domain: The intersection.
+        """
+
+        intervals = []
+        i = j = 0
+        while i < len(self.intervals) and j < len(other.intervals):
+            first = self.intervals[i]
+            second = other.intervals[j]
+
+            if first[0] != second[0]:
+                lower, lower_closed = max((first[0], first[2]), (second[0], second[2]), key=lambda bound: bound[0])
+            else:
+                lower, lower_closed = first[0], first[2] and second[2]
+            if first[1] != second[1]:
+                upper, upper_closed = min((first[1], first[3]), (second[1], second[3]), key=lambda bound: bound[0])
+            else:
+                upper, upper_closed = first[1], first[3] and second[3]
+
+            if lower < upper or (lower == upper and lower_closed and upper_closed):
+                intervals.append((lower, upper, lower_closed, upper_closed))
+
+            #Move past whichever interval ends first
+            if (first[1], first[3]) <= (second[1], second[3]):
+                i += 1
+            else:
+                j += 1
+
+        return Domain(intervals)
+
+    def is_empty(self):
+        """Indicates if the domain has no x values.
+
+        Returns:
+            bool: If there are no intervals.
+        """
+        return len(self.intervals) == 0
+
+    def __eq__(self, other):
+        return isinstance(other, Domain) and self.intervals == other.intervals
+
+    def __str__(self):
+        if self.is_empty():
+            return '{}'
+        return ' U '.join(
+            '{l}{a}, {b}{u}'.format(l='[' if lower_closed else '(', a=lower, b=upper, u=']' if upper_closed else ')')
+            for lower, upper, lower_closed, upper_closed in self.intervals
+            )
+
+
+class Polynomial():
+    """A sum of constant multiples of non-negative integer powers of x.
+
+        Dense polynomials are evaluated with Horner's scheme. Sparse ones, such
+        as x^1000 + 1, square x repeatedly and multiply together the squares
+        that make up each power, sharing the squares between terms. Whichever
+        needs fewer multiplications is used.
+
+        Attributes:
+            coefficients ({int: int/float}): The non-zero coefficient of each power of x.
+    """
+
+    def __init__(self, coefficients):
+        self.coefficients = {n: c for n, c in coefficients.items() if c != 0}
+        self._evaluators = None
+
+    def degree(self):
+        """Returns the highest power of x in the polynomial (0 if there are none).
+
+        Returns:
+            int: The degree.
+        """
+        return max(self.coefficients, default=0)
+
+    def is_dense(self):
+        """Indicates if Horner's scheme needs no more multiplications than squaring.
+
+        Returns:
+            bool: If the polynomial is evaluated with Horner's scheme.
+        """
+
+        degree = self.degree()
+        squaring = degree.bit_length() - 1 + sum(bin(n).count('1') for n in self.coefficients)
+        return degree <= squaring
+
+    def calculate_value(self, x):
+        """Evaluates the polynomial for a specific value of x.
+
+        Parameters:
+            x (int/float): The value of x that the polynomial should be evaluated for.
+
+        Returns:
+            int/float: The value of the polynomial.
+        """
+
+        if self._evaluators is None:
+            self._evaluators = _compile_source(self.source(), {})
+        return self._evaluators[0](x)
+
+    def evaluate_many(self, xs):
+        """Evaluates the polynomial for a sequence of x values.
+
+        Parameters:
+            xs (sequence of int/float): The x values that the polynomial should be evaluated for.
+
+        Returns:
+            array: The values of the polynomial as floats.
+        """
+
+        if self._evaluators is None:
+            self._evaluators = _compile_source(self.source(), {})
+        return self._evaluators[1](xs)
+
+    def source(self):
+        """Returns a Python expression in x that evaluates the polynomial.
+
+        Returns:
+            str: The source code of the expression.
+        """
+
+        if len(self.coefficients) == 0:
+            return '0'
+        if self.is_dense():
+            return self._horner_source()
+        return self._squaring_source()
+
+    def _horner_source(self):
+        degree = self.degree()
+        expression = '({c!r})'.format(c=self.coefficients[degree])
+        for n in range(degree - 1, -1, -1):
+            expression = '({e})*x'.format(e=expression)
+            if n in self.coefficients:
+                expression = '{e} + ({c!r})'.format(e=expression, c=self.coefficients[n])
+        return expression
+
+    def _squaring_source(self):
+        #_pk holds x^(2^k), assigned the first time it is needed
+        names = ['x']
+        terms = []
+
+        for n in sorted(self.coefficients):
+            factors = ['({c!r})'.format(c=self.coefficients[n])]
+            for k in range(n.bit_length()):
+                if not (n >> k) & 1:
+                    continue
+                if k < len(names):
+                    factors.append(names[k])
+                    continue
+
+                #Square up from the highest power already assigned
+                expression = names[-1]
+                for j in range(len(names), k + 1):
+                    if j == len(names):
+                        expression = '(_p{j} := {e}*{e})'.format(j=j, e=expression)
+                    else:
+                        expression = '(_p{j} := {e}*_p{i})'.format(j=j, e=expression, i=j-1)
+                names.extend('_p{j}'.format(j=j) for j in range(len(names), k + 1))
+                factors.append(expression)
+
+            terms.append('*'.join(factors))
+
+        return ' + '.join(terms)
+
+    def __str__(self):
+        return ' + '.join(
+            '{c}x^({n})'.format(c=self.coefficients[n], n=n) if n else str(self.coefficients[n])
+            for n in sorted(self.coefficients, reverse=True)
+            ) or '0'
+
+
+def sample_uniform(evaluate_many, a, b, n, domain=None, chunk=None):
+    """Evaluates a function at equally spaced x values, a chunk at a time.
+
+    This is how both lines and exported tables are sampled, so they agree on
+    the x values and on which of them are undefined. Only x values in the
+    domain are evaluated, and f(x) is NaN for the rest.
+
+    Parameters:
+        evaluate_many (callable): Calculates f(x) for an array of x values,
+            giving NaN where it is undefined (see Function.compile).
+        a (int/float): The first x value.
+        b (int/float): The last x value.
+        n (int): The number of steps between a and b, giving n + 1 values.
+        domain (Domain): Where f(x) may be defined (default is everywhere).
+        chunk (int): The most values in each chunk (default is all of them at once).
+
+    Yields:
+        (array, array): The x values and f(x) values of each chunk.
+    """
+
+    step = (b - a) / n
+    if chunk is None:
+        chunk = n + 1
+
+    for first in range(0, n + 1, chunk):
+        xs = array('d', (a + (counter * step) for counter in range(first, min(first + chunk, n + 1))))
+        if domain is None:
+            defined = [(0, len(xs))]
+        elif step > 0:
+            defined = domain.index_ranges(xs)
+        else:
+            defined = [(i, i + 1) for i, x in enumerate(xs) if domain.contains(x)]
+
+        #Only the spans where f(x) may be defined are evaluated
+        ys = array('d', [nan]) * len(xs)
+        for start, end in defined:
+            ys[start:end] = evaluate_many(xs[start:end])
+        yield xs, ys
+
+
+#Exponents that x can be raised to without a general power
+_power_sources = {
+    1: 'x',
+    2: 'x*x',
+    3: 'x*x*x',
+    4: '(x*x)*(x*x)',
+    -1: '1/x',
+    -2: '1/(x*x)',
+    -3: '1/(x*x*x)',
+    -4: '1/((x*x)*(x*x))'
+    }
+
+#The same exponents as callables, for evaluating a single Power
+_power_functions = {
+    1: lambda x: x,
+    2: lambda x: x*x,
+    3: lambda x: x*x*x,
+    4: lambda x: (x*x)*(x*x),
+    -1: lambda x: 1/x,
+    -2: lambda x: 1/(x*x),
+    -3: lambda x: 1/(x*x*x),
+    -4: lambda x: 1/((x*x)*(x*x))
+    }
+
+def _power_function(exponent, real_branch=False):
+    """Returns a callable for x^exponent that avoids a general power, if there is one.
+
+    Gives the same values as the expression from _power_source.
+
+    Parameters:
+        exponent (int/float): The constant exponent.
+        real_branch (bool): If odd roots of negative x should be real.
+
+    Returns:
+        callable: Takes x and returns x^exponent, or None if x**exponent should be used.
+    """
+
+    if isinstance(exponent, int):
+        return _power_functions.get(exponent)
+    if exponent == 0.5:
+        return sqrt
+
+    root = _odd_root(exponent) if real_branch else None
+    if root is None:
+        return None
+    p = root[0]
+    if root[1] == 3 and cbrt is not None:
+        return cbrt if p == 1 else lambda x: cbrt(x)**p
+    if p % 2 == 0:
+        return lambda x: abs(x)**exponent
+    return lambda x: copysign(abs(x)**exponent, x)
+
+def _power_source(exponent, real_branch=False):
+    """Returns an expression for x^exponent that avoids a general power, if there is one.
+
+    Parameters:
+        exponent (int/float): The constant exponent.
+        real_branch (bool): If odd roots of negative x should be real.
+
+    Returns:
+        str: The source code of the expression, or None if x**exponent should be used.
+    """
+
+    if isinstance(exponent, int):
+        return _power_sources.get(exponent)
+    if exponent == 0.5:
+        #sqrt raises a ValueError for negative x, as a complex result would
+        return 'sqrt(x)'
+
+    root = _odd_root(exponent) if real_branch else None
+    if root is None:
+        return None
+    if root[1] == 3 and cbrt is not None:
+        return 'cbrt(x)' if root[0] == 1 else 'cbrt(x)**{p}'.format(p=root[0])
+    if root[0] % 2 == 0:
+        #An even power of the root is positive either side of 0
+        return 'abs(x)**{e!r}'.format(e=exponent)
+    return 'copysign(abs(x)**{e!r}, x)'.format(e=exponent)
+
+def _odd_root(exponent, max_denominator=1000, tolerance=1e-12):
+    """Finds the fraction p/q with an odd denominator q > 1 that an exponent is close to.
+
+    Parameters:
+        exponent (int/float): The constant exponent.
+        max_denominator (int): The largest q that is tried.
+        tolerance (float): How far the exponent may be from p/q, relative to its size.
+
+    Returns:
+        (int, int): p and q, or None if the exponent is not such a fraction.
+    """
+
+    if not isfinite(exponent) or exponent == int(exponent):
+        return None
+    fraction = Fraction(exponent).limit_denominator(max_denominator)
+    if fraction.denominator % 2 == 0 or abs(fraction - Fraction(exponent)) > tolerance * abs(exponent):
+        return None
+    return (fraction.numerator, fraction.denominator)
+
+def _real(value):
+    """Raises a ValueError if a value from a compiled function is complex."""
+
+    if isinstance(value, complex):
+        raise ValueError('Result is a complex number: {result}'.format(result=value))
+    return value
+
+_scalar_template = """def evaluate(x):
+    return {expression}
+"""
+
+_batch_template = """def evaluate_many(xs):
+    values = array('d')
+    append = values.append
+    for x in xs:
+        try:
+            y = {expression}
+            #Overflow can give inf rather than raising, and is undefined either way
+            if not isfinite(y):
+                y = nan
+        except Exception:
+            y = nan
+        append(y)
+    return values
+"""
+
+def _compile_source(expression, bindings):
+    """Builds callables that evaluate an expression in x.
+
+    Parameters:
+        expression (str): The source code of the expression.
+        bindings (dict): The names the expression refers to.
+
+    Returns:
+        (callable, callable): A function of one x value, and a function of a
+        sequence of x values that gives an array with NaN where the expression raises
+        or is not finite.
+    """
+
+    namespace = dict(bindings, _real=_real, sqrt=sqrt, cbrt=cbrt, copysign=copysign, array=array, nan=nan, isfinite=isfinite)
+    exec(_scalar_template.format(expression=expression), namespace)
+    exec(_batch_template.format(expression=expression), namespace)
+    return namespace['evaluate'], namespace['evaluate_many']
+
+def _compile_terms(terms, name):
+    """Builds the callables returned by Function.compile.
+
+    Parameters:
+        terms ([Term]): The terms to be summed.
+        name (str): The name of the variable used in the function.
+
+    Returns:
+        (callable, callable): The compiled function for one x value and for many.
+    """
+
+    if len(terms) == 0:
+        message = 'Function f({name}) is undefined'.format(name=name)
+        def undefined(x):
+            raise ValueError(message)
+        def undefined_many(xs):
+            return array('d', [nan]) * len(xs)
+        return undefined, undefined_many
+
+    polynomial = Function(terms).as_polynomial()
+    if polynomial is not None:
+        return _compile_source(polynomial.source(), {})
 
+    bindings = {}
+    expression = ' + '.join(['0'] + [t._source(bindings) for t in terms])
+    return _compile_source(expression, bindings)
@@ -3,11 +3,26 @@ Simple graph plotter
 
 Plots a graph in a tkinter window with axes, grid lines and displays
 functions in the form y = f(x) using functions.py
+
+A Graph can also draw onto one of the headless canvases in backends.py
+to save images without a display.
 """
 
 from functions import *
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from copy import copy
+from heapq import heappop, heappush
+from math import ceil, floor, inf, isfinite, log10, log2, nan
+from queue import Empty, Queue
+from threading import RLock, Thread
+from time import perf_counter
 from tkinter import Tk, Canvas
 
+#How many values are calculated between checks for cancelled sampling
+CHECK_SAMPLES = 128
+
 class App:
     """A window with a Graph object that can be run to display the graph.
 
@@ -26,12 +41,16 @@ class App:
         self.window = Tk()
         self.window.title('Graph')
         self.graph = Graph(self.window, self.height, self.width)
+        self.graph.bind_controls()
 
         #Initialise axes and gridlines so they lie underneath
         #the plotted functions
         self.graph.add_grid_lines()
         self.graph.add_axes()
 
+        #Sample lines in the background so the window appears straight away
+        self.graph.enable_progressive()
+
     def add_function(self, function):
         """Adds a line representing a function to the list of lines.
 
@@ -40,7 +59,10 @@ class App:
 
         """
         
-        self.graph.add_line(FunctionLine(function))
+        line = FunctionLine(function)
+        #Tiled sampling keeps panning and zooming cheap
+        line.set_sampling('tiled')
+        self.graph.add_line(line)
 
     def add_axis(self, function):
         """Adds a horizontal or vertical line to the list of lines.
@@ -73,29 +95,46 @@ class Graph:
             width (int): The width of the canvas.
             scale (int, int): Values representing how many pixels represent 1 unit in x and y directions.
             centre (int, int): An x and y value representing the location of the centre of the canvas.
-            range (int, int): The range of x and y values that the graph shows.
+            range (float, float): The range of x and y values either side of the middle of the canvas
+                that the graph shows, worked out from the scale (read only).
             lines ([Line]): The list of lines that the graph can plot.
             line_colours ([str]): The default colours that can be assigned to lines.
             axis_colour (str): The colour of the axes.
             grid_colour (str): The colour of the gridlines.
-            canvas (tkinter.Canvas): The canvas object which shows the lines.
+            canvas (tkinter.Canvas or HeadlessCanvas): The canvas object which shows the lines.
+            preview (bool): If lines may be drawn from samples at a nearby zoom level while zooming.
+            stats (PlotStats or None): Where timings are collected while plotting (default is None,
+                which collects nothing).
+            grid (GridLayer): The grid lines and axes, which are drawn before the other lines.
+            renderer (ProgressiveRenderer or None): What samples lines in the background when
+                the graph is plotted (default is None, which samples them before plot returns).
     """
     
-    def __init__(self, master, height, width):
+    def __init__(self, master, height, width, canvas=None):
         self.height = height
         self.width = width
 
         #Conversion from coordinates to pixels (e.g. 1 unit = 10 pixels)
         self.scale = (20, 10) 
         self.centre = (width//2, height//2)
-        self.range = (self.centre[0] // self.scale[0], self.centre[1] // self.scale[1])
 
         self.lines = []
         
         self.line_colours = ['red', 'green', 'blue']
         self.axis_colour = 'black'
         self.grid_colour = '#D3D3D3' #Light grey
-        self.canvas = Canvas(bg='white', height=self.height, width=self.width)
+        #Any object with the same drawing methods as a tkinter Canvas can
+        #be used, e.g. a canvas from backends.py when there is no display
+        if canvas is None:
+            canvas = Canvas(master, bg='white', height=self.height, width=self.width)
+        self.canvas = canvas
+
+        self.preview = False
+        self.drag_start = None
+        self.pending_refine = None
+        self.stats = None
+        self.grid = GridLayer()
+        self.renderer = None
 
     def add_line(self, line, colour=None):
         """Adds a line to the list of lines to be plotted.
@@ -114,39 +153,195 @@ class Graph:
         self.lines.append(line)
 
     def add_axes(self):
-        """Adds axes to the list of lines to be plotted.
+        """Shows the axes when the graph is plotted.
        
         """
         
-        x_axis = Axis('horizontal', 0)
-        y_axis = Axis('vertical', 0)
-
-        self.add_line(x_axis, self.axis_colour)
-        self.add_line(y_axis, self.axis_colour)
+        self.grid.show_axes = True
 
     def add_grid_lines(self):
-        """Adds grid lines to the list of lines to be plotted.
+        """Shows grid lines when the graph is plotted, spaced to suit the scale.
        
         """
         
-        unit = 5
-        for counter in range(0, self.range[0], unit):
-            self.add_line(Axis('vertical', counter), self.grid_colour)
-            self.add_line(Axis('vertical', -counter), self.grid_colour)
-
-        for counter in range(0, self.range[1], unit):
-            self.add_line(Axis('horizontal', counter), self.grid_colour)
-            self.add_line(Axis('horizontal', -counter), self.grid_colour)
+        self.grid.show_grid = True
             
     def plot(self):
         """Plots each line on the canvas.
        
         """
         
-        for line in self.lines:
-            line.draw(self, -self.range[0], -self.range[1], self.range[0], self.range[1])
+        x_min, y_min, x_max, y_max = self.get_viewport()
+        with _timed(self.stats, None, 'plot'):
+            with _timed(self.stats, None, 'grid'):
+                self.grid.draw(self)
+            for line in self.lines:
+                #Axes are cheap, so are always drawn straight away
+                if self.renderer is not None and not isinstance(line, Axis):
+                    self.renderer.submit(line, x_min, y_min, x_max, y_max)
+                    continue
+                with _timed(self.stats, line, 'draw'):
+                    line.draw(self, x_min, y_min, x_max, y_max)
         self.canvas.pack()
 
+    def enable_stats(self, profile_terms=False):
+        """Starts collecting timings and counts each time the graph is plotted.
+
+        Parameters:
+            profile_terms (bool): If the cost of each term is measured as well, which
+                evaluates every term again.
+
+        Returns:
+            PlotStats: The new statistics.
+        """
+
+        self.stats = PlotStats(profile_terms)
+        return self.stats
+
+    def disable_stats(self):
+        """Stops collecting timings and counts.
+
+        """
+        self.stats = None
+
+    def enable_progressive(self, passes=(32, 128), poll_interval=15):
+        """Samples lines on a background thread from now on, drawing coarse passes first.
+
+        Parameters:
+            passes ([int]): The numbers of equal steps drawn before each line's own sampling.
+            poll_interval (int or None): How many milliseconds to wait between checking for
+                finished passes, None to only check when poll or wait is called. Always None
+                for canvases without an event loop to call after on, such as headless ones.
+
+        Returns:
+            ProgressiveRenderer: The new renderer.
+        """
+
+        if not hasattr(self.canvas, 'after'):
+            poll_interval = None
+        self.disable_progressive()
+        self.renderer = ProgressiveRenderer(self, passes, poll_interval)
+        return self.renderer
+
+    def disable_progressive(self):
+        """Stops sampling lines in the background, abandoning any unfinished work.
+
+        """
+
+        if self.renderer is not None:
+            self.renderer.stop()
+        self.renderer = None
+
+    def redraw(self):
+        """Plots every line again, even those that have not changed.
+
+        Canvas lines are still updated in place rather than recreated.
+
+        """
+
+        for line in self.lines:
+            line.mark_dirty()
+        self.plot()
+
+    def get_viewport(self):
+        """Returns the range of coordinates visible on the canvas.
+
+        Returns:
+            (float, float, float, float): The minimum x, minimum y, maximum x and maximum y values shown.
+        """
+
+        return (
+            -self.centre[0] / self.scale[0],
+            (self.centre[1] - self.height) / self.scale[1],
+            (self.width - self.centre[0]) / self.scale[0],
+            self.centre[1] / self.scale[1]
+            )
+
+    @property
+    def range(self):
+        x_min, y_min, x_max, y_max = self.get_viewport()
+        return ((x_max - x_min) / 2, (y_max - y_min) / 2)
+
+    def pan(self, dx, dy):
+        """Moves the graph across the canvas.
+
+        Parameters:
+            dx (int/float): The number of pixels to move right.
+            dy (int/float): The number of pixels to move down.
+        """
+
+        self.centre = (self.centre[0] + dx, self.centre[1] + dy)
+
+    def zoom(self, factor, about=None):
+        """Changes the scale of the graph, keeping one point on the canvas still.
+
+        Parameters:
+            factor (int/float): How many times larger the graph should appear.
+            about (int/float, int/float): The canvas position that stays still (default is the middle of the canvas).
+
+        Raises:
+            ValueError: If the factor is not positive.
+        """
+
+        if not factor > 0:
+            raise ValueError('Zoom factor must be positive')
+        if about is None:
+            about = (self.width / 2, self.height / 2)
+
+        self.scale = (self.scale[0] * factor, self.scale[1] * factor)
+        self.centre = (
+            about[0] + (self.centre[0] - about[0]) * factor,
+            about[1] + (self.centre[1] - about[1]) * factor
+            )
+
+    def bind_controls(self):
+        """Lets the graph be dragged with the mouse and zoomed with the scroll wheel.
+
+        """
+
+        self.canvas.bind('<ButtonPress-1>', self.on_press)
+        self.canvas.bind('<B1-Motion>', self.on_drag)
+        self.canvas.bind('<MouseWheel>', self.on_scroll)
+        #X11 reports the scroll wheel as buttons 4 and 5
+        self.canvas.bind('<Button-4>', self.on_scroll)
+        self.canvas.bind('<Button-5>', self.on_scroll)
+
+    def on_press(self, event):
+        self.drag_start = (event.x, event.y)
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            self.drag_start = (event.x, event.y)
+            return
+
+        self.pan(event.x - self.drag_start[0], event.y - self.drag_start[1])
+        self.drag_start = (event.x, event.y)
+        self.redraw()
+
+    def on_scroll(self, event):
+        if event.num == 5 or getattr(event, 'delta', 0) < 0:
+            factor = 1 / 1.25
+        else:
+            factor = 1.25
+        self.zoom(factor, (event.x, event.y))
+
+        #Draw straight away from whatever samples are cached, then
+        #draw properly once scrolling has paused
+        self.preview = True
+        self.redraw()
+        if self.pending_refine is not None:
+            self.canvas.after_cancel(self.pending_refine)
+        self.pending_refine = self.canvas.after(100, self.refine)
+
+    def refine(self):
+        """Redraws the graph using samples at the exact zoom level.
+
+        """
+
+        self.pending_refine = None
+        self.preview = False
+        self.redraw()
+
     def convert_coordinate(self, coordinate):
         """Converts a coordinate into a position on the canvas.
 
@@ -170,9 +365,128 @@ class Graph:
 
         return new_coordinate
 
+    def convert_coordinates(self, coordinates):
+        """Converts a buffer of coordinates into positions on the canvas.
+
+        Parameters:
+            coordinates (CoordinateBuffer): The coordinates to be converted.
+
+        Returns:
+            CoordinateBuffer: New coordinates that refer to the canvas.
+        """
+
+        return coordinates.transform(self.centre, self.scale)
+
     def get_canvas(self):
         return self.canvas
 
+class GridLayer:
+    """The grid lines and axes of a graph, worked out from the visible range.
+
+        Grid lines are placed at multiples of 1, 2 or 5 times a power of ten, choosing
+        the smallest step that keeps them at least min_spacing pixels apart, so the
+        number of lines stays the same at any zoom. All the grid lines are drawn as
+        one canvas line, joined up outside the edges of the canvas, and the canvas
+        lines are updated in place each time the graph is plotted.
+
+        Attributes:
+            show_grid (bool): If grid lines are drawn (default is False).
+            show_axes (bool): If the axes are drawn (default is False).
+            min_spacing (int/float): The fewest pixels between grid lines.
+            margin (int): How many pixels outside the canvas the joins between grid lines are.
+            items ([int]): The IDs of the lines last drawn on the canvas.
+    """
+
+    def __init__(self):
+        self.show_grid = False
+        self.show_axes = False
+        self.min_spacing = 50
+        self.margin = 2
+        self.items = []
+        self.drawn_canvas = None
+
+    def step(self, scale):
+        """Finds the spacing of grid lines for a scale.
+
+        Parameters:
+            scale (int/float): How many pixels represent 1 unit.
+
+        Returns:
+            int/float: The distance in units between grid lines.
+        """
+
+        units = self.min_spacing / scale
+        magnitude = 10 ** floor(log10(units))
+        for multiple in (1, 2, 5):
+            if multiple * magnitude >= units:
+                return multiple * magnitude
+        return 10 * magnitude
+
+    def ticks(self, minimum, maximum, scale):
+        """Finds the values that grid lines are drawn at.
+
+        Parameters:
+            minimum (int/float): The smallest value shown.
+            maximum (int/float): The largest value shown.
+            scale (int/float): How many pixels represent 1 unit.
+
+        Returns:
+            [int/float]: The multiples of the step from minimum to maximum.
+        """
+
+        step = self.step(scale)
+        return [n * step for n in range(ceil(minimum / step), floor(maximum / step) + 1)]
+
+    def draw(self, graph):
+        """Draws the grid lines and axes that are switched on.
+
+        Parameters:
+            graph (Graph): The graph to draw on.
+        """
+
+        canvas = graph.get_canvas()
+        x_min, y_min, x_max, y_max = graph.get_viewport()
+        centre = graph.centre
+        lines = []
+
+        if self.show_grid:
+            top = -self.margin
+            bottom = graph.height + self.margin
+            left = -self.margin
+            right = graph.width + self.margin
+            points = []
+
+            #Alternate direction so each join runs along just outside an edge
+            for i, value in enumerate(self.ticks(x_min, x_max, graph.scale[0])):
+                x = centre[0] + round(value * graph.scale[0])
+                points.extend((x, top, x, bottom) if i % 2 == 0 else (x, bottom, x, top))
+            if points:
+                points.extend((left, points[-1]))
+
+            for i, value in enumerate(self.ticks(y_min, y_max, graph.scale[1])):
+                y = centre[1] - round(value * graph.scale[1])
+                points.extend((left, y, right, y) if i % 2 == 0 else (right, y, left, y))
+
+            if len(points) >= 4:
+                lines.append((points, graph.grid_colour))
+
+        if self.show_axes:
+            if y_min <= 0 <= y_max:
+                lines.append(([0, centre[1], graph.width, centre[1]], graph.axis_colour))
+            if x_min <= 0 <= x_max:
+                lines.append(([centre[0], 0, centre[0], graph.height], graph.axis_colour))
+
+        if self.drawn_canvas is not canvas:
+            self.items = []
+            self.drawn_canvas = canvas
+        created = len(self.items)
+        self.items = _update_items(canvas, self.items, lines)
+
+        #Lines added since the last plot still go behind everything else
+        for item in reversed(self.items[created:]):
+            canvas.tag_lower(item)
+
+
 class Coordinate:
     """A pair of x, y values that represent a point on the graph.
 
@@ -183,6 +497,8 @@ class Coordinate:
             y (int/float or None): The y value.
     """
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.set_x(x)
         self.set_y(y)
@@ -251,28 +567,722 @@ class Coordinate:
 
     def __str__(self):
         return '({x}, {y})'.format(x=self.x, y=self.y)
+
+
+class CoordinateBuffer:
+    """A sequence of coordinates stored as two arrays of floats.
+
+        Invalid values are stored as NaN. Indexing the buffer gives a Coordinate
+        with None in place of NaN.
+
+        Attributes:
+            xs (array): The x values.
+            ys (array): The y values.
+    """
+
+    def __init__(self, xs=(), ys=()):
+        self.xs = array('d', xs)
+        self.ys = array('d', ys)
+        if len(self.xs) != len(self.ys):
+            raise ValueError('xs and ys must have the same length')
+
+    def append(self, x, y):
+        """Adds a coordinate to the end of the buffer.
+
+        Parameters:
+            x (int/float or None): The x value.
+            y (int/float or None): The y value.
+        """
+
+        self.xs.append(nan if x is None else x)
+        self.ys.append(nan if y is None else y)
+
+    def valid(self):
+        """Indicates which coordinates are valid.
+
+        Returns:
+            bytearray: 1 for each coordinate with real x and y values, otherwise 0.
+        """
+
+        return bytearray(x == x and y == y for x, y in zip(self.xs, self.ys))
+
+    def in_range(self, x_min, y_min, x_max, y_max):
+        """Indicates which coordinates are within a given range.
+
+        Returns:
+            bytearray: 1 for each coordinate that is valid and within the range, otherwise 0.
+        """
+
+        return bytearray(
+            x_min <= x <= x_max and y_min <= y <= y_max for x, y in zip(self.xs, self.ys)
+            )
+
+    def clip(self, x_min, y_min, x_max, y_max, domain=None):
+        """Cuts the line through the coordinates down to the parts within a given range.
+
+        Each segment between adjacent valid coordinates is clipped to the range with the
+        Liang-Barsky algorithm, so a segment that crosses the edge is cut there rather than
+        left out. Segments with both ends inside are kept as they are without clipping.
+
+        Parameters:
+            x_min (int/float): The minimum x value that is shown on the graph.
+            y_min (int/float): The minimum y value that is shown on the graph.
+            x_max (int/float): The maximum x value that is shown on the graph.
+            y_max (int/float): The maximum y value that is shown on the graph.
+            domain (Domain): Where the line may be defined. Segments that cross a gap
+                in it (e.g. jump across a pole) are left out (default is everywhere).
+
+        Returns:
+            (CoordinateBuffer, [(int, int)]): The clipped coordinates, and the start and end
+            index of each continuous run of them, each with at least two coordinates.
+        """
+
+        xs = self.xs
+        ys = self.ys
+        clipped = CoordinateBuffer()
+        append = clipped.append
+        runs = []
+        start = None
+
+        #Only a domain of more than one interval has gaps between samples
+        if domain is not None and len(domain.intervals) < 2:
+            domain = None
+
+        for i in range(len(xs) - 1):
+            x0 = xs[i]
+            y0 = ys[i]
+            x1 = xs[i+1]
+            y1 = ys[i+1]
+
+            if domain is not None and not domain.contains_range(x0, x1):
+                if start is not None:
+                    runs.append((start, len(clipped)))
+                    start = None
+                continue
+
+            if x_min <= x0 <= x_max and y_min <= y0 <= y_max and x_min <= x1 <= x_max and y_min <= y1 <= y_max:
+                t0 = 0
+                t1 = 1
+            else:
+                ends = None
+                if isfinite(x0) and isfinite(y0) and isfinite(x1) and isfinite(y1):
+                    ends = _clip_segment(x0, y0, x1, y1, x_min, y_min, x_max, y_max)
+                if ends is None:
+                    if start is not None:
+                        runs.append((start, len(clipped)))
+                        start = None
+                    continue
+                t0, t1 = ends
+
+            #A segment cut at its start begins a new run
+            if t0 > 0 or start is None:
+                if start is not None:
+                    runs.append((start, len(clipped)))
+                start = len(clipped)
+                append(x0 + t0 * (x1 - x0), y0 + t0 * (y1 - y0))
+
+            if t1 < 1:
+                append(x0 + t1 * (x1 - x0), y0 + t1 * (y1 - y0))
+                runs.append((start, len(clipped)))
+                start = None
+            else:
+                append(x1, y1)
+
+        if start is not None:
+            runs.append((start, len(clipped)))
+        return clipped, runs
+
+    def swap(self):
+        """Swaps the x and y coordinates, reflecting every coordinate in y=x.
+
+        """
+        self.xs, self.ys = self.ys, self.xs
+
+    def transform(self, centre, scale):
+        """Converts the coordinates into positions on a canvas.
+
+        Parameters:
+            centre (int, int): The position on the canvas of the origin.
+            scale (int, int): How many pixels represent 1 unit in x and y directions.
+
+        Returns:
+            CoordinateBuffer: The rounded canvas positions, NaN where a value is not finite.
+        """
+
+        return CoordinateBuffer(
+            (centre[0] + round(x * scale[0]) if isfinite(x) else nan for x in self.xs),
+            (centre[1] - round(y * scale[1]) if isfinite(y) else nan for y in self.ys)
+            )
+
+    def __len__(self):
+        return len(self.xs)
+
+    def extend(self, coordinates):
+        """Adds the coordinates from another buffer to the end of this one.
+
+        Parameters:
+            coordinates (CoordinateBuffer): The coordinates to be added.
+        """
+
+        self.xs.extend(coordinates.xs)
+        self.ys.extend(coordinates.ys)
+
+    def copy(self):
+        """Returns a new buffer holding the same coordinates.
+
+        Returns:
+            CoordinateBuffer: The copy.
+        """
+        return CoordinateBuffer(self.xs, self.ys)
+
+    def nbytes(self):
+        """Returns the memory used by the values in the buffer.
+
+        Returns:
+            int: The number of bytes.
+        """
+        return len(self.xs) * (self.xs.itemsize + self.ys.itemsize)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CoordinateBuffer(self.xs[index], self.ys[index])
+
+        x = self.xs[index]
+        y = self.ys[index]
+        return Coordinate(x if x == x else None, y if y == y else None)
+
+    def __iter__(self):
+        for index in range(len(self.xs)):
+            yield self[index]
     
 
+class SampleCache:
+    """A store of sampled coordinates that can be shared between lines and graphs.
+
+        Entries are keyed on the structure of the function and how it was sampled,
+        so changing a function (e.g. with add_term or Power.set_b) gives it a new
+        key and the old samples are no longer used. When the entries use more than
+        max_bytes, the least recently used are removed. A cache can be used from
+        more than one thread, e.g. by a ProgressiveRenderer's worker and the canvas.
+
+        Attributes:
+            max_bytes (int): The most memory the stored coordinates may use.
+            size (int): The memory currently used by the stored coordinates.
+            hits (int): The number of lookups that found samples.
+            misses (int): The number of lookups that did not find samples.
+            entries (OrderedDict): The stored coordinates, least recently used first.
+            lock (RLock): Held while the entries and counters are read or changed.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = RLock()
+
+    def get(self, key):
+        """Looks up stored coordinates.
+
+        Parameters:
+            key (tuple): The key the coordinates were stored under.
+
+        Returns:
+            CoordinateBuffer: A copy of the coordinates, or None if they are not stored.
+        """
+
+        with self.lock:
+            coordinates = self.entries.get(key)
+            if coordinates is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        #Stored coordinates are never changed, so can be copied without the lock
+        return coordinates.copy()
+
+    def put(self, key, coordinates):
+        """Stores a copy of some coordinates, removing old entries if needed.
+
+        Parameters:
+            key (tuple): The key to store the coordinates under.
+            coordinates (CoordinateBuffer): The coordinates to be stored.
+        """
+
+        coordinates = coordinates.copy()
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).nbytes()
+
+            #Coordinates that could never fit are not stored at all
+            if coordinates.nbytes() > self.max_bytes:
+                return
+
+            self.entries[key] = coordinates
+            self.size += coordinates.nbytes()
+            self.evict()
+
+    def set_max_bytes(self, max_bytes):
+        """Changes the memory limit, removing entries that no longer fit.
+
+        Parameters:
+            max_bytes (int): The new limit in bytes.
+
+        Raises:
+            ValueError: If the limit is negative.
+        """
+
+        if max_bytes < 0:
+            raise ValueError('max_bytes must not be negative')
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the limit is met.
+
+        """
+
+        with self.lock:
+            while self.size > self.max_bytes:
+                key, coordinates = self.entries.popitem(last=False)
+                self.size -= coordinates.nbytes()
+
+    def clear(self):
+        """Removes every entry and resets the counters.
+
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+#Shared by every FunctionLine unless it is given its own caches
+sample_cache = SampleCache()
+tile_cache = SampleCache()
+
+
+class PlotStats:
+    """Timings and counts collected while a graph is plotted.
+
+        Times are in seconds and add up over every plot until reset. The stages are
+        'plot' (the whole graph), and for each line 'draw', 'generate' (sampling f(x)),
+        'convert' (to canvas positions), 'range' (finding what can be drawn), 'simplify'
+        (dropping vertices that cannot be seen) and 'create_line' (canvas calls). The counts
+        for each line are 'samples', 'invalid' (undefined samples), 'removed_vertices'
+        (vertices dropped by simplifying) and 'items' (canvas lines drawn).
+
+        Attributes:
+            profile_terms (bool): If the cost of each term is measured after sampling.
+            stages (dict): The total time of each stage over all lines.
+            lines (dict): The times and counts of each line, by line.
+            term_costs (dict): The time spent evaluating each term at the sampled x values, by str(term).
+            hooks ([callable]): Called as hook(name, line, value) with every time and count
+                as it is recorded, where line is None for 'plot'.
+    """
+
+    def __init__(self, profile_terms=False):
+        self.profile_terms = profile_terms
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        """Forgets every time and count.
+
+        """
+
+        self.stages = {}
+        self.lines = {}
+        self.term_costs = {}
+
+    def add_hook(self, hook):
+        """Adds a callback that receives each time and count as it is recorded.
+
+        Parameters:
+            hook (callable): Called as hook(name, line, value).
+        """
+        self.hooks.append(hook)
+
+    def add(self, line, name, value):
+        """Adds to a time or count.
+
+        Parameters:
+            line (FunctionLine or None): The line it belongs to, None for the whole graph.
+            name (str): The stage or count.
+            value (int/float): The seconds or number to add.
+        """
+
+        if line is not None:
+            totals = self.lines.setdefault(line, {})
+            totals[name] = totals.get(name, 0) + value
+        if name not in ('samples', 'invalid', 'removed_vertices', 'items'):
+            self.stages[name] = self.stages.get(name, 0) + value
+        for hook in self.hooks:
+            hook(name, line, value)
+
+    @contextmanager
+    def time(self, line, stage):
+        """Times the code inside a with statement as a stage.
+
+        Parameters:
+            line (FunctionLine or None): The line being drawn, None for the whole graph.
+            stage (str): The name of the stage.
+        """
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(line, stage, perf_counter() - start)
+
+    def count_samples(self, line):
+        """Counts the samples of a line that has just generated its coordinates.
+
+        Parameters:
+            line (FunctionLine): The line.
+        """
+
+        samples = len(line.coordinates)
+        self.add(line, 'samples', samples)
+        self.add(line, 'invalid', samples - sum(line.coordinates.valid()))
+
+        if self.profile_terms and not isinstance(line, Axis):
+            xs = array('d', (x for x in line.coordinates.xs if x == x))
+            for term in line.function.terms:
+                start = perf_counter()
+                term.evaluate_many(xs)
+                name = str(term)
+                self.term_costs[name] = self.term_costs.get(name, 0) + perf_counter() - start
+
+    def as_dict(self):
+        """Returns the statistics in a form that can be written as JSON.
+
+        Returns:
+            dict: The stages, each line's times and counts by str(line), and the term costs.
+        """
+
+        lines = {}
+        for line, totals in self.lines.items():
+            merged = lines.setdefault(str(line), {})
+            for name, value in totals.items():
+                merged[name] = merged.get(name, 0) + value
+        return {'stages': dict(self.stages), 'lines': lines, 'term_costs': dict(self.term_costs)}
+
+    def __str__(self):
+        rows = ['{stage:<12} {seconds:10.6f}s'.format(stage=stage, seconds=seconds)
+                for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1])]
+        for line, totals in self.lines.items():
+            rows.append('{line}: {totals}'.format(line=line, totals=', '.join(
+                '{name}={value:.6g}'.format(name=name, value=value) for name, value in totals.items())))
+        return '\n'.join(rows)
+
+
+#Shared do-nothing context for when statistics are not being collected
+_untimed = nullcontext()
+
+def _timed(stats, line, stage):
+    if stats is None:
+        return _untimed
+    return stats.time(line, stage)
+
+
+class Cancelled(Exception):
+    """Raised part way through sampling a line once its result is no longer wanted."""
+
+
+class CancelToken:
+    """Tells background work that its result is no longer wanted.
+
+        Attributes:
+            cancelled (bool): If the work has been cancelled.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancels the work.
+
+        """
+        self.cancelled = True
+
+    def check(self):
+        """Stops the work if it has been cancelled.
+
+        Raises:
+            Cancelled: If the work has been cancelled.
+        """
+        if self.cancelled:
+            raise Cancelled()
+
+
+class ProgressiveRenderer:
+    """Samples lines on a worker thread and draws each pass as it finishes.
+
+        Each line is first sampled with a few equal steps so something appears quickly,
+        then with more, then with its own sampling. Finished passes are collected by poll,
+        which runs on the thread that owns the canvas (scheduled with after), since only
+        that thread may draw. Plotting again with a different function or viewport cancels
+        the line's unfinished passes, and the pass being sampled stops within a few tiles
+        or chunks of samples.
+
+        Attributes:
+            graph (Graph): The graph the lines are drawn on.
+            passes ([int]): The numbers of equal steps drawn before each line's own sampling.
+            poll_interval (int or None): How many milliseconds to wait between checking for
+                finished passes, None to only check when poll or wait is called.
+            in_flight (dict): The draw key and CancelToken of each line still being sampled, by line.
+            jobs (Queue): The lines waiting for the worker.
+            results (Queue): The passes waiting to be drawn.
+            pending_poll (str or None): The ID of the scheduled poll.
+    """
+
+    def __init__(self, graph, passes=(32, 128), poll_interval=15):
+        self.graph = graph
+        self.passes = list(passes)
+        self.poll_interval = poll_interval
+        self.in_flight = {}
+        self.jobs = Queue()
+        self.results = Queue()
+        self.pending_poll = None
+        self.worker = None
+
+    def submit(self, line, x_min, y_min, x_max, y_max):
+        """Starts sampling a line in the background unless it is already drawn or being sampled.
+
+        Parameters:
+            line (FunctionLine): The line to be drawn.
+            x_min (int/float): The minimum x value that is shown on the graph.
+            y_min (int/float): The minimum y value that is shown on the graph.
+            x_max (int/float): The maximum x value that is shown on the graph.
+            y_max (int/float): The maximum y value that is shown on the graph.
+        """
+
+        graph = self.graph
+        key = line.draw_key(graph, x_min, y_min, x_max, y_max)
+        if key == line.drawn_key and graph.get_canvas() is line.drawn_canvas:
+            return
+
+        if line in self.in_flight:
+            in_flight_key, token = self.in_flight[line]
+            if in_flight_key == key:
+                return
+            token.cancel()
+
+        token = CancelToken()
+        self.in_flight[line] = (key, token)
+
+        #Cached samples are drawn as soon as they are collected
+        passes = self.passes
+        if line.sampling != 'tiled' and line.cache is not None and line.sample_key(
+                x_min, x_max, graph.scale, (y_min, y_max)) in line.cache:
+            passes = []
+
+        if self.worker is None:
+            self.worker = Thread(target=self.work, daemon=True)
+            self.worker.start()
+        self.jobs.put((line, key, token, passes, (x_min, y_min, x_max, y_max), graph.scale, graph.preview))
+        self.schedule()
+
+    def work(self):
+        """Samples each line that is submitted until stopped, on the worker thread.
+
+        """
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            line, key, token, passes, viewport, scale, preview = job
+            x_min, y_min, x_max, y_max = viewport
+
+            try:
+                #A copy is sampled so the canvas thread can keep drawing the line
+                sampler = copy(line)
+                for no_steps in passes:
+                    token.check()
+                    if no_steps >= line.no_sublines:
+                        continue
+                    coordinates = _sample_uniform(sampler.evaluator(True), x_min, x_max, no_steps, line.function.domain(), token)
+                    self.results.put((line, key, token, viewport, coordinates, False, None))
+
+                token.check()
+                sampler.generate_coordinates(x_min, x_max, scale, (y_min, y_max), preview, token)
+                self.results.put((line, key, token, viewport, sampler.coordinates, True, None))
+            except Cancelled:
+                pass
+            except Exception as error:
+                self.results.put((line, key, token, viewport, None, True, error))
+
+    def schedule(self):
+        """Checks for finished passes after poll_interval milliseconds, if not already due to.
+
+        """
+
+        if self.pending_poll is None and self.poll_interval is not None:
+            self.pending_poll = self.graph.get_canvas().after(self.poll_interval, self.poll)
+
+    def poll(self):
+        """Draws every pass that has finished since the last poll.
+
+        Raises:
+            Exception: Any error raised while sampling a line.
+        """
+
+        self.pending_poll = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except Empty:
+                break
+            self.apply(result)
+
+        if self.in_flight:
+            self.schedule()
+
+    def wait(self, timeout=None):
+        """Draws passes as they finish until every line is drawn, for use without an event loop.
+
+        Parameters:
+            timeout (int/float or None): The most seconds to wait, None to wait until done.
+
+        Returns:
+            bool: If every line was drawn before the timeout.
+
+        Raises:
+            Exception: Any error raised while sampling a line.
+        """
+
+        deadline = None if timeout is None else perf_counter() + timeout
+        while self.in_flight:
+            remaining = None if deadline is None else max(deadline - perf_counter(), 0)
+            try:
+                result = self.results.get(timeout=remaining)
+            except Empty:
+                return False
+            self.apply(result)
+        return True
+
+    def apply(self, result):
+        """Draws a finished pass, unless it has been cancelled.
+
+        Parameters:
+            result (tuple): The pass, as put on results by the worker.
+
+        Raises:
+            Exception: Any error raised while sampling the line.
+        """
+
+        line, key, token, viewport, coordinates, final, error = result
+        if token.cancelled:
+            return
+        if final:
+            del self.in_flight[line]
+        if error is not None:
+            raise error
+
+        graph = self.graph
+        line.coordinates = coordinates
+        if final and graph.stats is not None:
+            graph.stats.count_samples(line)
+        with _timed(graph.stats, line, 'draw'):
+            line.draw_sublines(graph, *viewport)
+        line.drawn_key = key if final else None
+
+    def cancel(self):
+        """Cancels every line still being sampled.
+
+        """
+
+        for key, token in self.in_flight.values():
+            token.cancel()
+        self.in_flight = {}
+
+    def stop(self):
+        """Cancels all work and ends the worker thread.
+
+        """
+
+        self.cancel()
+        if self.pending_poll is not None:
+            self.graph.get_canvas().after_cancel(self.pending_poll)
+            self.pending_poll = None
+        if self.worker is not None:
+            self.jobs.put(None)
+            self.worker = None
+
+
 class FunctionLine:
     """A line which can be represented by y=f(x).
 
         Attributes:
             function (Function): The funciton f(x) that represents the line.
             colour (str): The hexcode or name of the colour of the line (default is red).
-            coordinates ([Coordinate]): The coordinates of points on the line.
-            sublines ([int]): The IDs of the lines on the canvas.
+            coordinates (CoordinateBuffer): The coordinates of points on the line.
+            sublines ([int]): The IDs of the lines on the canvas, one per run if polyline is set.
             no_sublines (int): The number of lines that should be drawn to represent the funciton.
+            sampling (str): 'uniform' for no_sublines equal steps or 'adaptive' to refine where the line curves.
+            tolerance (int/float): How many pixels an adaptively sampled line may stray from the function.
+            max_samples (int): The most values of f(x) that adaptive sampling may calculate.
+            initial_intervals (int): How many equal intervals adaptive sampling starts from.
+            polyline (bool): If each continuous run of coordinates is drawn as one canvas line
+                rather than one line per pair of coordinates (default is True).
+            clip (bool): If segments that cross the edge of the graph are cut at the edge
+                rather than left out (default is True).
+            vertex_tolerance (int/float or None): How many pixels a vertex may be from the line
+                through its neighbours and still be dropped before drawing (default is 0.5),
+                None to draw every vertex.
+            removed_vertices (int): How many vertices were dropped when the line was last drawn.
+            cache (SampleCache or None): Where sampled coordinates are reused from (default is the
+                shared sample_cache, None to always evaluate).
+            tiles (SampleCache): Where tiles for tiled sampling are kept (default is the shared tile_cache).
+            tile_pixels (int): The width in pixels of a tile at its own zoom level.
+            tile_samples (int): The number of equal steps each tile is sampled with.
+            auto_simplify (bool): If samples are calculated from the simplified function (default is False).
+            drawn_key (tuple or None): Everything the canvas lines depended on when they were last
+                drawn, None if they need drawing again.
+            drawn_canvas (Canvas or None): The canvas the lines in sublines are on.
     """
 
+    sampling_modes = ['uniform', 'adaptive', 'tiled']
+
     def __init__(self, function, colour='red'):
         if not isinstance(function, Function):
             raise TypeError('function must be an instance of Function')
 
         self.function = function
         self.colour = colour
-        self.coordinates = [] 
+        self.coordinates = CoordinateBuffer()
         self.sublines = [] 
         self.no_sublines = 500
+        self.sampling = 'uniform'
+        self.tolerance = 0.5
+        self.max_samples = 2000
+        self.initial_intervals = 4
+        self.polyline = True
+        self.clip = True
+        self.vertex_tolerance = 0.5
+        self.removed_vertices = 0
+        self.cache = sample_cache
+        self.tiles = tile_cache
+        self.tile_pixels = 128
+        self.tile_samples = 64
+        self.auto_simplify = False
+        self.simplified = None
+        self.simplified_key = None
+        self.drawn_key = None
+        self.drawn_canvas = None
 
     def set_colour(self, colour):
         """Changes the colour of the line.
@@ -282,6 +1292,54 @@ class FunctionLine:
         """
         self.colour = colour
 
+    def set_sampling(self, sampling, tolerance=None, max_samples=None):
+        """Changes how the x values of the line are chosen.
+
+            Parameters:
+                sampling (str): 'uniform', 'adaptive' or 'tiled'.
+                tolerance (int/float): The new adaptive tolerance in pixels (unchanged if None).
+                max_samples (int): The new limit on adaptive samples (unchanged if None).
+
+            Raises:
+                ValueError: If the sampling mode is not recognised or the limits are not positive.
+        """
+
+        if sampling not in FunctionLine.sampling_modes:
+            raise ValueError('Invalid value for sampling')
+        if tolerance is not None and not tolerance > 0:
+            raise ValueError('Tolerance must be positive')
+        if max_samples is not None and max_samples < 2 * self.initial_intervals + 1:
+            raise ValueError('max_samples must be at least {n}'.format(n=2 * self.initial_intervals + 1))
+
+        self.sampling = sampling
+        if tolerance is not None:
+            self.tolerance = tolerance
+        if max_samples is not None:
+            self.max_samples = max_samples
+
+    def evaluator(self, batch=False):
+        """Returns the callable used to calculate f(x) for samples.
+
+            If auto_simplify is set, this is compiled from the simplified function,
+            which is only simplified again when the function changes.
+
+            Parameters:
+                batch (bool): If the callable should evaluate a sequence of x values at once.
+
+            Returns:
+                callable: Takes x and returns f(x), or if batch is set takes a sequence
+                of x values and returns an array with NaN where f(x) is undefined.
+        """
+
+        if not self.auto_simplify:
+            return self.function.compile(batch)
+
+        key = self.function.key()
+        if self.simplified is None or self.simplified_key != key:
+            self.simplified = self.function.simplify()
+            self.simplified_key = key
+        return self.simplified.compile(batch)
+
     def draw(self, graph, x_min, y_min, x_max, y_max):
         """Draws y=f(x) on the graph.
 
@@ -292,37 +1350,237 @@ class FunctionLine:
                 y_max (int/float): The maximum y value that is shown on the graph.
         """
         
-        self.generate_coordinates(x_min, x_max)
+        key = self.draw_key(graph, x_min, y_min, x_max, y_max)
+        if key == self.drawn_key and graph.get_canvas() is self.drawn_canvas:
+            return
+
+        with _timed(graph.stats, self, 'generate'):
+            self.generate_coordinates(x_min, x_max, graph.scale, (y_min, y_max), graph.preview)
+        if graph.stats is not None:
+            graph.stats.count_samples(self)
         self.draw_sublines(graph, x_min, y_min, x_max, y_max)
+        self.drawn_key = key
+
+    def draw_key(self, graph, x_min, y_min, x_max, y_max):
+        """Describes everything that the drawn line depends on.
 
-    def generate_coordinates(self, a, b):
+            The line only needs drawing again when this changes, e.g. when the function,
+            colour or visible range changes.
+
+            Parameters:
+                graph (Graph): The graph the line is drawn on.
+                x_min (int/float): The minimum x value that is shown on the graph.
+                x_max (int/float): The maximum x value that is shown on the graph.
+                y_min (int/float): The minimum y value that is shown on the graph.
+                y_max (int/float): The maximum y value that is shown on the graph.
+
+            Returns:
+                tuple: The key.
+        """
+
+        return (
+            self.sample_key(x_min, x_max, graph.scale, (y_min, y_max)),
+            self.sampling, self.tile_pixels, self.tile_samples, self.auto_simplify,
+            self.polyline, self.clip, self.vertex_tolerance, self.colour, y_min, y_max, graph.centre, graph.scale, graph.preview
+            )
+
+    def mark_dirty(self):
+        """Makes the line draw again the next time the graph is plotted.
+
+        """
+        self.drawn_key = None
+
+    def generate_coordinates(self, a, b, scale=(1, 1), y_range=(-inf, inf), preview=False, token=None):
         """Generates coordinates for y=f(x) for some a <= x <= b.
 
             Parameters:
                 a (int/float): The start x coordinate of the range to evaluate f(x) for.
                 b (int/float): The end x coordinate of the range to evaluate f(x) for.
+                scale (int/float, int/float): How many pixels represent 1 unit in x and y directions,
+                    used by adaptive and tiled sampling.
+                y_range (int/float, int/float): The minimum and maximum y values that are shown,
+                    used by adaptive sampling.
+                preview (bool): If tiled sampling may use tiles cached at a nearby zoom level.
+                token (CancelToken or None): Checked while sampling, so the work can be cancelled.
+
+            Raises:
+                Cancelled: If the token is cancelled before the coordinates are finished,
+                    in which case they are not cached.
         """
-        self.coordinates = []
-        step = (b-a) / self.no_sublines
 
-        #Calculate (number of sub lines + 1) coordinates for the line
-        for counter in range(self.no_sublines + 1):
-            x = a + (counter * step)
-            try:
-                y = self.function.calculate_value(x)
-                
-            #If the result is a complex number, or function is undefined for
-            #that x value
-            except ValueError:
-                y = None
-
-            #Usually caused by an invalid x value, so say function is undefined
-            #for y and provide a valid x value
-            except:
-                x = None
-                y = None
-                
-            self.coordinates.append(Coordinate(x, y))
+        #Tiles are cached separately, so the range does not need to be
+        if self.sampling == 'tiled':
+            self.generate_tiled_coordinates(a, b, scale, preview, token)
+            return
+
+        if self.cache is not None:
+            key = self.sample_key(a, b, scale, y_range)
+            coordinates = self.cache.get(key)
+            if coordinates is not None:
+                self.coordinates = coordinates
+                return
+
+        if self.sampling == 'adaptive':
+            self.generate_adaptive_coordinates(a, b, scale, y_range, token)
+        else:
+            self.generate_uniform_coordinates(a, b, token)
+
+        if self.cache is not None:
+            self.cache.put(key, self.coordinates)
+
+    def sample_key(self, a, b, scale=(1, 1), y_range=(-inf, inf)):
+        """Describes the samples generate_coordinates would calculate.
+
+            Parameters:
+                a (int/float): The start x coordinate of the range to evaluate f(x) for.
+                b (int/float): The end x coordinate of the range to evaluate f(x) for.
+                scale (int/float, int/float): How many pixels represent 1 unit in x and y directions.
+                y_range (int/float, int/float): The minimum and maximum y values that are shown.
+
+            Returns:
+                tuple: A key that is equal whenever the samples would be the same.
+        """
+
+        if self.sampling == 'adaptive':
+            sampling = ('adaptive', self.tolerance, self.max_samples, self.initial_intervals, tuple(scale), tuple(y_range))
+        else:
+            sampling = ('uniform', self.no_sublines)
+        return (self.function.key(), a, b, sampling)
+
+    def generate_uniform_coordinates(self, a, b, token=None):
+        """Generates coordinates for y=f(x) at no_sublines + 1 equally spaced x values from a to b.
+
+            Parameters:
+                a (int/float): The start x coordinate of the range to evaluate f(x) for.
+                b (int/float): The end x coordinate of the range to evaluate f(x) for.
+                token (CancelToken or None): Checked between chunks of samples.
+
+            Raises:
+                Cancelled: If the token is cancelled.
+        """
+
+        self.coordinates = _sample_uniform(self.evaluator(True), a, b, self.no_sublines, self.function.domain(), token)
+
+    def generate_tiled_coordinates(self, a, b, scale, preview=False, token=None):
+        """Generates coordinates for y=f(x) for some a <= x <= b from cached tiles.
+
+            The x axis is split into tiles tile_pixels wide at the zoom level nearest to the
+            scale, where each zoom level doubles the scale. Only tiles that are not cached are
+            evaluated, so moving the range only evaluates the newly visible tiles.
+
+            Parameters:
+                a (int/float): The start x coordinate of the range to evaluate f(x) for.
+                b (int/float): The end x coordinate of the range to evaluate f(x) for.
+                scale (int/float, int/float): How many pixels represent 1 unit in x and y directions.
+                preview (bool): If a nearby zoom level that is fully cached may be used instead.
+                token (CancelToken or None): Checked before each tile is evaluated.
+
+            Raises:
+                Cancelled: If the token is cancelled. Tiles already evaluated stay cached.
+        """
+
+        function_key = self.function.key()
+        level = round(log2(scale[0]))
+        if preview:
+            level = self.nearest_cached_level(function_key, a, b, level)
+
+        width = self.tile_pixels / 2**level
+        evaluate_many = None
+        domain = None
+        self.coordinates = CoordinateBuffer()
+
+        for index in range(floor(a / width), ceil(b / width)):
+            key = (function_key, level, index, self.tile_pixels, self.tile_samples)
+            tile = self.tiles.get(key)
+            if tile is None:
+                if token is not None:
+                    token.check()
+                if evaluate_many is None:
+                    evaluate_many = self.evaluator(True)
+                    domain = self.function.domain()
+                tile = _sample_uniform(evaluate_many, index * width, (index + 1) * width, self.tile_samples, domain)
+                self.tiles.put(key, tile)
+
+            #Adjacent tiles share their end points
+            if len(self.coordinates) > 0:
+                tile = tile[1:]
+            self.coordinates.extend(tile)
+
+    def nearest_cached_level(self, function_key, a, b, level, distance=4):
+        """Finds the zoom level closest to level with every tile for a <= x <= b cached.
+
+            Parameters:
+                function_key (tuple): The key of the function.
+                a (int/float): The start x coordinate of the range.
+                b (int/float): The end x coordinate of the range.
+                level (int): The preferred zoom level.
+                distance (int): How many levels above or below to look.
+
+            Returns:
+                int: The nearest fully cached level, or level if there is none.
+        """
+
+        for offset in range(distance + 1):
+            for candidate in sorted({level + offset, level - offset}):
+                width = self.tile_pixels / 2**candidate
+                if all((function_key, candidate, index, self.tile_pixels, self.tile_samples) in self.tiles
+                       for index in range(floor(a / width), ceil(b / width))):
+                    return candidate
+        return level
+
+    def generate_adaptive_coordinates(self, a, b, scale, y_range=(-inf, inf), token=None):
+        """Generates coordinates for y=f(x) for some a <= x <= b, placing them where f(x) curves.
+
+            The range is split into initial_intervals equal intervals, then the interval whose
+            midpoint is furthest from the straight line between its end points is halved
+            repeatedly until every interval is within tolerance pixels or max_samples values
+            have been calculated. Each x value is only evaluated once, and x values outside the
+            domain of the function are not evaluated at all.
+
+            Parameters:
+                a (int/float): The start x coordinate of the range to evaluate f(x) for.
+                b (int/float): The end x coordinate of the range to evaluate f(x) for.
+                scale (int/float, int/float): How many pixels represent 1 unit in x and y directions.
+                y_range (int/float, int/float): The minimum and maximum y values that are shown.
+                token (CancelToken or None): Checked every CHECK_SAMPLES values calculated.
+
+            Raises:
+                Cancelled: If the token is cancelled.
+        """
+
+        calculate_value = self.evaluator()
+        domain = self.function.domain()
+        samples = {}
+
+        def evaluate(x):
+            if x not in samples:
+                if token is not None and len(samples) % CHECK_SAMPLES == 0:
+                    token.check()
+                samples[x] = _sample(calculate_value, x) if domain.contains(x) else (x, None)
+            return samples[x][1]
+
+        def queue_interval(x0, x1):
+            xm = (x0 + x1) / 2
+            error = _chord_error(x0, evaluate(x0), xm, evaluate(xm), x1, evaluate(x1), scale, y_range)
+            if error > self.tolerance:
+                heappush(intervals, (-error, x0, x1))
+
+        intervals = []
+        step = (b-a) / self.initial_intervals
+        points = [a + (counter * step) for counter in range(self.initial_intervals)] + [b]
+        for x0, x1 in zip(points, points[1:]):
+            queue_interval(x0, x1)
+
+        #Each split calculates the midpoints of the two new intervals
+        while intervals and len(samples) + 2 <= self.max_samples:
+            error, x0, x1 = heappop(intervals)
+            xm = (x0 + x1) / 2
+            queue_interval(x0, xm)
+            queue_interval(xm, x1)
+
+        self.coordinates = CoordinateBuffer()
+        for x in sorted(samples):
+            self.coordinates.append(*samples[x])
 
     def draw_sublines(self, graph, x_min, y_min, x_max, y_max):
         """Draws straight lines between adjacent coordinates to form the line.
@@ -334,33 +1592,288 @@ class FunctionLine:
                 y_max (int/float): The maximum y value that is shown on the graph.
         """
         
-        self.sublines = []
-        #Accesses coordinates in pairs and draws a straight line
-        #between them
-        for i in range(len(self.coordinates) -1):
-            c1 = self.coordinates[i]
-            c2 = self.coordinates[i+1]
-
-            #If either is invalid, do not draw the line
-            if not (c1.is_valid() and c2.is_valid()):
-                continue
+        canvas = graph.get_canvas()
+        if self.drawn_canvas is not canvas:
+            self.sublines = []
+            self.drawn_canvas = canvas
+
+        with _timed(graph.stats, self, 'range'):
+            if self.clip:
+                coordinates, runs = self.coordinates.clip(x_min, y_min, x_max, y_max, self.function.domain())
+            else:
+                coordinates = self.coordinates
+                runs = self.runs(x_min, y_min, x_max, y_max)
+        with _timed(graph.stats, self, 'convert'):
+            screen = graph.convert_coordinates(coordinates)
+
+        runs = [(screen.xs[start:end], screen.ys[start:end]) for start, end in runs]
+        if self.vertex_tolerance is not None:
+            with _timed(graph.stats, self, 'simplify'):
+                vertices = sum(len(xs) for xs, ys in runs)
+                runs = [_simplify_run(xs, ys, self.vertex_tolerance) for xs, ys in runs]
+                self.removed_vertices = vertices - sum(len(xs) for xs, ys in runs)
+        else:
+            self.removed_vertices = 0
+        if graph.stats is not None:
+            graph.stats.add(self, 'removed_vertices', self.removed_vertices)
+
+        lines = []
+        for xs, ys in runs:
+            if self.polyline:
+                points = []
+                for x, y in zip(xs, ys):
+                    points.append(x)
+                    points.append(y)
+                lines.append((points, self.colour))
+            else:
+                #A straight line between each pair of adjacent coordinates in the run
+                for i in range(len(xs) - 1):
+                    lines.append(([xs[i], ys[i], xs[i+1], ys[i+1]], self.colour))
+
+        #Existing canvas lines are moved rather than recreated
+        with _timed(graph.stats, self, 'create_line'):
+            self.sublines = _update_items(canvas, self.sublines, lines)
+        if graph.stats is not None:
+            graph.stats.add(self, 'items', len(self.sublines))
+
+    def runs(self, x_min, y_min, x_max, y_max):
+        """Splits the coordinates into runs that can each be drawn as one line.
+
+            A run is a longest sequence of adjacent coordinates that are all valid and in range,
+            so it covers exactly the pairs that draw_sublines would join.
 
-            #If either is out of range, do not draw the line
-            if not (c1.in_range(x_min, y_min, x_max, y_max) and c2.in_range(x_min, y_min, x_max, y_max)):
-                continue
+            Parameters:
+                x_min (int/float): The minimum x value that is shown on the graph.
+                x_max (int/float): The maximum x value that is shown on the graph.
+                y_min (int/float): The minimum y value that is shown on the graph.
+                y_max (int/float): The maximum y value that is shown on the graph.
 
-            #Convert the coordinates into canvas locations
-            n1 = graph.convert_coordinate(c1)
-            n2 = graph.convert_coordinate(c2)
+            Returns:
+                [(int, int)]: The start and end index of each run, each with at least two coordinates.
+        """
 
-            canvas = graph.get_canvas()
-            
-            line = canvas.create_line(n1.get_x(), n1.get_y(), n2.get_x(), n2.get_y(), fill=self.colour)
-            self.sublines.append(line)
+        drawable = self.coordinates.in_range(x_min, y_min, x_max, y_max)
+        runs = []
+        start = 0
+        while True:
+            start = drawable.find(1, start)
+            if start == -1:
+                return runs
+
+            end = drawable.find(0, start)
+            if end == -1:
+                end = len(drawable)
+            if end - start > 1:
+                runs.append((start, end))
+            start = end
 
     def __str__(self):
         return 'y = {function}'.format(function=self.function)
 
+
+def _clip_segment(x0, y0, x1, y1, x_min, y_min, x_max, y_max):
+    """Clips a straight line to a rectangle with the Liang-Barsky algorithm.
+
+    Returns:
+        (float, float): How far along the line (from 0 to 1) the visible part
+        starts and ends, or None if no part of it is visible.
+    """
+
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = 0
+    t1 = 1
+    for p, q in ((-dx, x0 - x_min), (dx, x_max - x0), (-dy, y0 - y_min), (dy, y_max - y0)):
+        if p == 0:
+            #Parallel to this edge, so either wholly inside or outside it
+            if q < 0:
+                return None
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+
+    if t0 >= t1:
+        return None
+    return t0, t1
+
+def _simplify_run(xs, ys, tolerance):
+    """Drops vertices of a line that make no visible difference to it.
+
+    Repeated pixels are dropped first, then the Ramer-Douglas-Peucker algorithm
+    keeps only the vertices further than the tolerance from the line between the
+    vertices kept either side of them. The first and last vertices are always kept.
+
+    Parameters:
+        xs (array): The x position of each vertex in pixels.
+        ys (array): The y position of each vertex in pixels.
+        tolerance (int/float): How many pixels a dropped vertex may be from the simplified line.
+
+    Returns:
+        (array, array): The x and y positions of the vertices that are kept.
+    """
+
+    unique_xs = array('d', xs[:1])
+    unique_ys = array('d', ys[:1])
+    for x, y in zip(xs, ys):
+        if x != unique_xs[-1] or y != unique_ys[-1]:
+            unique_xs.append(x)
+            unique_ys.append(y)
+
+    n = len(unique_xs)
+    #A run that stays on one pixel still needs two ends to be drawn
+    if n < 3:
+        if n == 1 and len(xs) > 1:
+            return array('d', (xs[0], xs[-1])), array('d', (ys[0], ys[-1]))
+        return unique_xs, unique_ys
+
+    keep = bytearray(n)
+    keep[0] = keep[-1] = 1
+    limit = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0 = unique_xs[first]
+        y0 = unique_ys[first]
+        dx = unique_xs[last] - x0
+        dy = unique_ys[last] - y0
+        length = dx * dx + dy * dy
+
+        #Compares squared distances, scaled by the squared length of the line
+        furthest = first
+        distance = limit * length if length else limit
+        for i in range(first + 1, last):
+            px = unique_xs[i] - x0
+            py = unique_ys[i] - y0
+            if length:
+                d = dx * py - dy * px
+                d *= d
+            else:
+                d = px * px + py * py
+            if d > distance:
+                furthest = i
+                distance = d
+
+        if furthest != first:
+            keep[furthest] = 1
+            stack.append((first, furthest))
+            stack.append((furthest, last))
+
+    return (array('d', (x for x, k in zip(unique_xs, keep) if k)),
+            array('d', (y for y, k in zip(unique_ys, keep) if k)))
+
+def _update_items(canvas, items, lines):
+    """Makes a canvas show a set of lines, reusing the canvas lines it already has.
+
+    Existing lines are moved and recoloured in order, new ones are created if
+    there are not enough, and any left over are deleted.
+
+    Parameters:
+        canvas (Canvas): The canvas.
+        items ([int]): The IDs of the existing lines.
+        lines ([([int/float], str)]): The points and colour of each line to show.
+
+    Returns:
+        [int]: The IDs of the lines now shown.
+    """
+
+    shown = []
+    for i, (points, colour) in enumerate(lines):
+        if i < len(items):
+            canvas.coords(items[i], points)
+            canvas.itemconfigure(items[i], fill=colour)
+            shown.append(items[i])
+        else:
+            shown.append(canvas.create_line(points, fill=colour))
+
+    if len(items) > len(lines):
+        canvas.delete(*items[len(lines):])
+    return shown
+
+def _sample(calculate_value, x):
+    """Evaluates a point on a line, marking it invalid if f(x) is undefined.
+
+    Parameters:
+        calculate_value (callable): Calculates f(x).
+        x (int/float): The x value of the point.
+
+    Returns:
+        (int/float or None, int/float or None): The point (x, f(x)).
+    """
+
+    try:
+        y = calculate_value(x)
+
+    #If the result is a complex number, or function is undefined for
+    #that x value
+    except ValueError:
+        y = None
+
+    #Usually caused by an invalid x value, so say function is undefined
+    #for y and provide a valid x value
+    except:
+        x = None
+        y = None
+
+    return (x, y)
+
+def _sample_uniform(evaluate_many, a, b, no_steps, domain=None, token=None):
+    """Evaluates points on a line at equally spaced x values.
+
+    Parameters:
+        evaluate_many (callable): Calculates f(x) for a sequence of x values,
+            giving NaN where it is undefined (see Function.compile).
+        a (int/float): The first x value.
+        b (int/float): The last x value.
+        no_steps (int): The number of steps between a and b.
+        domain (Domain): Where f(x) may be defined, points outside it are
+            marked invalid without being evaluated (default is everywhere).
+        token (CancelToken or None): Checked after every CHECK_SAMPLES points are
+            evaluated (default is to evaluate every point at once).
+
+    Returns:
+        CoordinateBuffer: The (no_steps + 1) points.
+
+    Raises:
+        Cancelled: If the token is cancelled.
+    """
+
+    if token is None:
+        xs, ys = next(sample_uniform(evaluate_many, a, b, no_steps, domain))
+        return CoordinateBuffer(xs, ys)
+
+    coordinates = CoordinateBuffer()
+    for xs, ys in sample_uniform(evaluate_many, a, b, no_steps, domain, CHECK_SAMPLES):
+        token.check()
+        coordinates.xs.extend(xs)
+        coordinates.ys.extend(ys)
+    return coordinates
+
+def _chord_error(x0, y0, xm, ym, x1, y1, scale, y_range):
+    """Measures how far a midpoint is from the straight line between two points.
+
+    Parameters:
+        x0, y0, xm, ym, x1, y1 (int/float or None): The start, middle and end points.
+        scale (int/float, int/float): How many pixels represent 1 unit in x and y directions.
+        y_range (int/float, int/float): The minimum and maximum y values that are shown.
+
+    Returns:
+        float: The vertical distance in pixels. Intervals where the function becomes
+        undefined count as infinitely far, and intervals narrower than a pixel as exact.
+    """
+
+    ys = (y0, ym, y1)
+    if (x1 - x0) * scale[0] < 1 or all(y is None for y in ys):
+        return 0
+
+    if any(y is None or not isfinite(y) for y in ys):
+        return inf
+
+    #Parts of the line outside the graph are flattened onto its edge,
+    #since any detail there would not be seen
+    y0, ym, y1 = (min(max(y, y_range[0]), y_range[1]) for y in ys)
+    return abs(ym - (y0 + y1) / 2) * scale[1]
+
 class Axis(FunctionLine):
     """A line which is perpendicular to one of the axes.
 
@@ -401,21 +1914,28 @@ class Axis(FunctionLine):
                 y_max (int/float): The maximum y value that is shown on the graph.
         """
         
-        if self.orientation == Axis.orientations['horizontal']:
-            self.generate_coordinates(x_min, x_max)
-            
-        else:
-            #Treat a vertical line like a horizontal one, then
-            #swap x and y coordinates, essentially reflecting
-            #it in y=x
-            self.generate_coordinates(y_min, y_max)
-            for coordinate in self.coordinates:
-                coordinate.swap()
-                
+        key = self.draw_key(graph, x_min, y_min, x_max, y_max)
+        if key == self.drawn_key and graph.get_canvas() is self.drawn_canvas:
+            return
+
+        with _timed(graph.stats, self, 'generate'):
+            if self.orientation == Axis.orientations['horizontal']:
+                self.generate_coordinates(x_min, x_max)
+
+            else:
+                #Treat a vertical line like a horizontal one, then
+                #swap x and y coordinates, essentially reflecting
+                #it in y=x
+                self.generate_coordinates(y_min, y_max)
+                self.coordinates.swap()
+        if graph.stats is not None:
+            graph.stats.count_samples(self)
+
         self.draw_sublines(graph, x_min, y_min, x_max, y_max)
+        self.drawn_key = key
 
     #Generate values for f(a), ..., f(b)
-    def generate_coordinates(self, a, b):
+    def generate_coordinates(self, a, b, scale=(1, 1), y_range=(-inf, inf), preview=False, token=None):
         """Generates coordinates of the start and end points of the line.
 
         Parameters:
@@ -423,16 +1943,16 @@ class Axis(FunctionLine):
             b (int/float): The end x coordinate (horizontal) or y coordinate (vertical).
         """
         
-        self.coordinates = []
+        self.coordinates = CoordinateBuffer()
 
         try:
             #Treats the line like its horizontal (i.e. constant y value, x varies)
             #If it is a vertical line, this can be later accounted for by switching
             #x and y coordinates
-            self.coordinates.append(Coordinate(a, self.function.calculate_value(a)))
-            self.coordinates.append(Coordinate(b, self.function.calculate_value(b)))
+            self.coordinates.append(a, self.function.calculate_value(a))
+            self.coordinates.append(b, self.function.calculate_value(b))
         except:
-            self.coordinates = [Coordinate(None, None), Coordinate(None, None)]
+            self.coordinates = CoordinateBuffer([nan, nan], [nan, nan])
 
     def __str__(self):
         if self.orientation == Axis.orientations['horizontal']:
@@ -441,10 +1961,14 @@ class Axis(FunctionLine):
 
   
             
-if __name__ == '__main__':
-    app = App()
+def example_functions():
+    """Returns the example functions offered when the grapher is run.
 
-    examples = [
+    Returns:
+        [Function]: New copies of the examples.
+    """
+
+    return [
         Function([Power(Constant(1), Constant(1)), Constant(1)]),
         Function([Power(Constant(1), Constant(2))]),
         Function([Power(Constant(1), Constant(3))]),
@@ -454,6 +1978,11 @@ if __name__ == '__main__':
         Function([Power(Constant(1), Constant(0.5))])
         ]
 
+if __name__ == '__main__':
+    app = App()
+
+    examples = example_functions()
+
     #Display menu of different functions that the user can see
     counter = 1
     for example in examples:
@@ -0,0 +1,241 @@
+"""
+Parsing functions from text
+
+Reads the syntax that Function.__str__ produces, for example
+
+    f(x) = 7 + -3x^(2) + 1x^(1x^(2))
+
+as well as common ways of writing the same thing by hand:
+
+    3x^2 + x^(-1) - 5
+    2*x**3 - x
+
+A term is a number, optionally followed by the variable, with each use
+of the variable raised to a power (1 if no power is given). Powers are
+either a number or a whole term in brackets. Repeated terms and whole
+strings are remembered, so parsing many similar lines is fast.
+"""
+
+import re
+from functools import lru_cache
+from functions import *
+
+_token_pattern = re.compile(r'''
+    \s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf|nan)
+    |(?P<variable>[A-Za-z])
+    |(?P<operator>\*\*|[-+*^()])
+    |(?P<error>\S)
+    )''', re.VERBOSE)
+
+_prefix_pattern = re.compile(r'\s*[A-Za-z]\s*\(\s*([A-Za-z])\s*\)\s*=')
+
+
+def parse(text, name=None):
+    """Builds a function from its text.
+
+    Parameters:
+        text (str): The function, with or without an 'f(x) =' prefix.
+        name (str): The variable used in the function, default is the one in the prefix,
+            or otherwise the first letter used.
+
+    Returns:
+        Function: A new function.
+
+    Raises:
+        ValueError: If the text is not a valid function.
+    """
+
+    variable, descriptions = _describe_function(text, name)
+    return Function([_build(description) for description in descriptions], variable)
+
+def parse_term(text):
+    """Builds a single term from its text.
+
+    Parameters:
+        text (str): The term, for example '3x^(2)'.
+
+    Returns:
+        Term: A new term.
+
+    Raises:
+        ValueError: If the text is not a valid term.
+    """
+
+    tokens = _tokenize(text)
+    if len(_split_terms(tokens)) != 1:
+        raise ValueError('Expected a single term: {text}'.format(text=text))
+    return _build(_describe_term(tuple(tokens)))
+
+def parse_lines(lines, name=None):
+    """Parses one function per line, reading the lines as they are needed.
+
+    Parameters:
+        lines (iterable of str): The lines, such as an open file. Blank lines are skipped.
+        name (str): The variable used in each function (see parse).
+
+    Yields:
+        Function: The function on each line.
+
+    Raises:
+        ValueError: If a line is not a valid function, giving its line number.
+    """
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield parse(line, name)
+        except ValueError as error:
+            raise ValueError('Line {n}: {error}'.format(n=number, error=error))
+
+def clear_cache():
+    """Forgets every string and term that has been parsed."""
+
+    _describe_function.cache_clear()
+    _describe_term.cache_clear()
+
+
+@lru_cache(maxsize=4096)
+def _describe_function(text, name=None):
+    #Describes a function as its variable and a tuple of term descriptions,
+    #which are ('constant', value) or ('power', a, b)
+    prefix = _prefix_pattern.match(text)
+    if prefix is not None:
+        if name is not None and prefix.group(1) != name:
+            raise ValueError('Variable {v} does not match {name}'.format(v=prefix.group(1), name=name))
+        name = prefix.group(1)
+        text = text[prefix.end():]
+
+    if text.strip() == 'undefined':
+        return name or 'x', ()
+
+    tokens = _tokenize(text)
+    variables = {value for kind, value in tokens if kind == 'variable'}
+    if name is None:
+        name = next((value for kind, value in tokens if kind == 'variable'), 'x')
+    #Terms always print their variable as x, whatever the function calls it
+    unexpected = variables - {name, 'x'}
+    if unexpected:
+        raise ValueError('Unexpected variable {v} in function of {name}'.format(v=min(unexpected), name=name))
+
+    descriptions = []
+    for sign, term in _split_terms(tokens):
+        description = _describe_term(term)
+        descriptions.append(_negate(description) if sign == '-' else description)
+    return name, tuple(descriptions)
+
+def _tokenize(text):
+    #Reads the text in one pass, giving (kind, value) for each token
+    tokens = []
+    for match in _token_pattern.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        value = match.group(kind)
+        if kind == 'error':
+            raise ValueError('Unexpected {c!r} at position {i}'.format(c=value, i=match.start(kind)))
+        tokens.append((kind, '^' if value == '**' else value))
+
+    if not tokens:
+        raise ValueError('Expected a function')
+    return tokens
+
+def _split_terms(tokens):
+    #A + or - outside brackets separates terms if it follows the end of a term
+    terms = []
+    sign = '+'
+    start = 0
+    depth = 0
+    for i, (kind, value) in enumerate(tokens):
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif (value == '+' or value == '-') and depth == 0 and i > start:
+            previous_kind, previous = tokens[i - 1]
+            if previous_kind != 'operator' or previous == ')':
+                terms.append((sign, tuple(tokens[start:i])))
+                sign = value
+                start = i + 1
+
+    terms.append((sign, tuple(tokens[start:])))
+    return terms
+
+@lru_cache(maxsize=4096)
+def _describe_term(tokens):
+    description, position = _read_term(tokens, 0)
+    if position != len(tokens):
+        raise ValueError('Unexpected {t!r}'.format(t=tokens[position][1]))
+    return description
+
+def _read_term(tokens, position):
+    #A signed number and/or variable, then any number of variable^power
+    sign = 1
+    while _peek(tokens, position) in ('+', '-'):
+        if tokens[position][1] == '-':
+            sign = -sign
+        position += 1
+
+    if position < len(tokens) and tokens[position][0] == 'number':
+        description = ('constant', sign * _number(tokens[position][1]))
+        position += 1
+        if _peek(tokens, position) == '*':
+            position += 1
+            if position >= len(tokens) or tokens[position][0] != 'variable':
+                raise ValueError('Expected a variable after *')
+    elif position < len(tokens) and tokens[position][0] == 'variable':
+        description = ('constant', sign)
+    else:
+        raise ValueError('Expected a number or variable, found {t!r}'.format(
+            t=tokens[position][1] if position < len(tokens) else 'end'))
+
+    while position < len(tokens) and tokens[position][0] == 'variable':
+        position += 1
+        if _peek(tokens, position) == '^':
+            exponent, position = _read_power(tokens, position + 1)
+        else:
+            exponent = ('constant', 1)
+        description = ('power', description, exponent)
+
+    return description, position
+
+def _read_power(tokens, position):
+    if _peek(tokens, position) == '(':
+        exponent, position = _read_term(tokens, position + 1)
+        if _peek(tokens, position) != ')':
+            raise ValueError('Expected )')
+        return exponent, position + 1
+
+    #Without brackets the power is a signed number or the variable alone
+    sign = 1
+    while _peek(tokens, position) in ('+', '-'):
+        if tokens[position][1] == '-':
+            sign = -sign
+        position += 1
+
+    if position < len(tokens) and tokens[position][0] == 'number':
+        return ('constant', sign * _number(tokens[position][1])), position + 1
+    if position < len(tokens) and tokens[position][0] == 'variable':
+        return ('power', ('constant', sign), ('constant', 1)), position + 1
+    raise ValueError('Expected a power after ^')
+
+def _peek(tokens, position):
+    if position < len(tokens) and tokens[position][0] == 'operator':
+        return tokens[position][1]
+    return None
+
+def _number(text):
+    if text.isdigit():
+        return int(text)
+    return float(text)
+
+def _negate(description):
+    if description[0] == 'constant':
+        return ('constant', -description[1])
+    return ('power', _negate(description[1]), description[2])
+
+def _build(description):
+    if description[0] == 'constant':
+        return Constant(description[1])
+    return Power(_build(description[1]), _build(description[2]))
@@ -0,0 +1,253 @@
+"""
+Compact binary storage for functions
+
+Many functions are stored together in one corpus, laid out as:
+
+    header   b'PYGF', version (uint16), reserved (uint16), count (uint32)
+    offsets  count + 1 uint64 positions of each function, the last being the end
+    records  the functions, one after another
+
+Each record is the function's name (uint8 length then UTF-8), the number
+of terms (uint32), then each term in prefix order: a one byte tag, then
+the value of a Constant or the a and b terms of a Power. All numbers are
+little-endian.
+
+A FunctionCorpus reads straight from a buffer or memory-mapped file and
+only decodes a function when it is accessed, so opening a corpus does not
+depend on how many functions it holds.
+"""
+
+import mmap
+import struct
+from functions import *
+
+MAGIC = b'PYGF'
+VERSION = 1
+
+_header = struct.Struct('<4sHHI')
+_offset = struct.Struct('<Q')
+_count = struct.Struct('<I')
+_int8 = struct.Struct('<b')
+_int64 = struct.Struct('<q')
+_float = struct.Struct('<d')
+_length = struct.Struct('<H')
+
+#Term tags
+_TAG_INT8 = 1
+_TAG_INT64 = 2
+_TAG_BIGINT = 3
+_TAG_FLOAT = 4
+_TAG_POWER = 5
+_TAG_REAL_POWER = 6
+
+
+def encode_function(function):
+    """Converts a function into a record.
+
+    Parameters:
+        function (Function): The function to be encoded.
+
+    Returns:
+        bytes: The record.
+
+    Raises:
+        TypeError: If a term is not a Constant or Power.
+    """
+
+    name = function.name.encode('utf-8')
+    parts = [bytes([len(name)]), name, _count.pack(len(function.terms))]
+
+    stack = list(reversed(function.terms))
+    while stack:
+        t = stack.pop()
+        if isinstance(t, Power):
+            parts.append(bytes([_TAG_REAL_POWER if t.real_branch else _TAG_POWER]))
+            stack.append(t.b)
+            stack.append(t.a)
+        elif isinstance(t, Constant):
+            parts.append(_encode_constant(t.value))
+        else:
+            raise TypeError('Cannot encode term of type {kind}'.format(kind=type(t).__name__))
+
+    return b''.join(parts)
+
+def decode_function(buffer, offset=0):
+    """Builds a function from a record.
+
+    Parameters:
+        buffer (bytes-like): The data holding the record.
+        offset (int): The position of the record in the buffer.
+
+    Returns:
+        (Function, int): The function and the position just after the record.
+
+    Raises:
+        ValueError: If the record is malformed.
+    """
+
+    try:
+        length = buffer[offset]
+        name = bytes(buffer[offset + 1:offset + 1 + length]).decode('utf-8')
+        offset += 1 + length
+        no_terms = _count.unpack_from(buffer, offset)[0]
+        offset += _count.size
+
+        #Read the tags and values in prefix order, then build the terms from the
+        #end so the a and b of each Power are already on the stack
+        tokens = []
+        needed = no_terms
+        while needed > 0:
+            tag = buffer[offset]
+            offset += 1
+            if tag == _TAG_POWER or tag == _TAG_REAL_POWER:
+                tokens.append((tag, None))
+                needed += 1
+            else:
+                value, offset = _decode_constant(buffer, tag, offset)
+                tokens.append((tag, value))
+                needed -= 1
+    except (IndexError, struct.error, UnicodeDecodeError) as error:
+        raise ValueError('Malformed function record: {error}'.format(error=error))
+
+    stack = []
+    for tag, value in reversed(tokens):
+        if value is None:
+            term = Power(stack.pop(), stack.pop())
+            if tag == _TAG_REAL_POWER:
+                term.set_real_branch(True)
+            stack.append(term)
+        else:
+            stack.append(Constant(value))
+
+    return Function(stack[::-1], name), offset
+
+def dumps(functions):
+    """Encodes functions as a corpus.
+
+    Parameters:
+        functions (iterable of Function): The functions to be encoded.
+
+    Returns:
+        bytes: The corpus.
+    """
+
+    records = [encode_function(f) for f in functions]
+
+    position = _header.size + _offset.size * (len(records) + 1)
+    offsets = []
+    for record in records:
+        offsets.append(position)
+        position += len(record)
+    offsets.append(position)
+
+    return b''.join([_header.pack(MAGIC, VERSION, 0, len(records)),
+                     struct.pack('<{n}Q'.format(n=len(offsets)), *offsets)] + records)
+
+def dump(functions, path):
+    """Saves functions as a corpus file.
+
+    Parameters:
+        functions (iterable of Function): The functions to be saved.
+        path (str): The location of the file.
+    """
+
+    with open(path, 'wb') as stream:
+        stream.write(dumps(functions))
+
+def load(path):
+    """Opens a corpus file by memory-mapping it.
+
+    Parameters:
+        path (str): The location of the file.
+
+    Returns:
+        FunctionCorpus: The corpus, which should be closed when it is no longer needed.
+    """
+
+    with open(path, 'rb') as stream:
+        mapping = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    return FunctionCorpus(mapping)
+
+
+class FunctionCorpus:
+    """A read-only sequence of functions decoded from a buffer when accessed.
+
+        Attributes:
+            buffer (memoryview): The encoded corpus.
+            version (int): The version of the format the corpus was written with.
+    """
+
+    def __init__(self, buffer):
+        self._source = buffer
+        self.buffer = memoryview(buffer)
+
+        if len(self.buffer) < _header.size:
+            raise ValueError('Buffer is too short to be a function corpus')
+        magic, self.version, reserved, self._length = _header.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Buffer is not a function corpus')
+        if self.version != VERSION:
+            raise ValueError('Unsupported corpus version {v}'.format(v=self.version))
+        if len(self.buffer) < _header.size + _offset.size * (self._length + 1):
+            raise ValueError('Buffer is too short for {n} functions'.format(n=self._length))
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('Index {i} is out of range 0 <= i < {n}'.format(i=index, n=self._length))
+
+        start, end = struct.unpack_from('<2Q', self.buffer, _header.size + _offset.size * index)
+        function, position = decode_function(self.buffer, start)
+        if position != end:
+            raise ValueError('Malformed function record {i}'.format(i=index))
+        return function
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def close(self):
+        """Releases the buffer, closing it if it was memory-mapped."""
+
+        self.buffer.release()
+        if isinstance(self._source, mmap.mmap):
+            self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _encode_constant(value):
+    if isinstance(value, float):
+        return bytes([_TAG_FLOAT]) + _float.pack(value)
+    if -128 <= value < 128:
+        return bytes([_TAG_INT8]) + _int8.pack(value)
+    if -2**63 <= value < 2**63:
+        return bytes([_TAG_INT64]) + _int64.pack(value)
+
+    data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+    return bytes([_TAG_BIGINT]) + _length.pack(len(data)) + data
+
+def _decode_constant(buffer, tag, offset):
+    if tag == _TAG_INT8:
+        return _int8.unpack_from(buffer, offset)[0], offset + _int8.size
+    if tag == _TAG_INT64:
+        return _int64.unpack_from(buffer, offset)[0], offset + _int64.size
+    if tag == _TAG_FLOAT:
+        return _float.unpack_from(buffer, offset)[0], offset + _float.size
+    if tag == _TAG_BIGINT:
+        length = _length.unpack_from(buffer, offset)[0]
+        offset += _length.size
+        if offset + length > len(buffer):
+            raise IndexError('Constant runs past the end of the buffer')
+        return int.from_bytes(buffer[offset:offset + length], 'little', signed=True), offset + length
+    raise ValueError('Unknown term tag {tag}'.format(tag=tag))
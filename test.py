@@ -2,6 +2,20 @@
 import unittest
 from functions import *
 from grapher import *
+from backends import *
+import batch
+import grapher
+import benchmark
+import parsing
+import serialization
+import export
+import io
+import json
+import os
+import tempfile
+import threading
+import zlib
+from array import array
 
 class TestConstant(unittest.TestCase):
 
@@ -80,6 +94,111 @@ class TestPower(unittest.TestCase):
 
 
 
+    def test_specialised_exponents(self):
+        for b in [1, 2, 3, 4, -1, -2, -3, -4, 0.5, 1.5, 7]:
+            power_term = Power(Constant(2), Constant(b))
+            for x in [0.5, 1, 2, 3.25]:
+                self.assertAlmostEqual(power_term.calculate_value(x), 2 * x**b, msg='2 * {x}^{b}'.format(x=x, b=b))
+                self.assertAlmostEqual(power_term.evaluate_many([x])[0], 2 * x**b, msg='2 * {x}^{b}'.format(x=x, b=b))
+
+        with self.assertRaises(ZeroDivisionError):
+            Power(Constant(1), Constant(-2)).calculate_value(0)
+        with self.assertRaises(ValueError):
+            Power(Constant(1), Constant(0.5)).calculate_value(-4) #sqrt(-4) = 2i
+
+        values = Power(Constant(1), Constant(0.5)).evaluate_many([-4, 4])
+        self.assertTrue(values[0] != values[0])
+        self.assertEqual(values[1], 2)
+
+        #Repeated multiplication overflows to inf, which is undefined in a batch
+        power_term = Power(Constant(1), Constant(3))
+        self.assertEqual(power_term.calculate_value(1e200), inf)
+        self.assertTrue(power_term.evaluate_many([1e200])[0] != power_term.evaluate_many([1e200])[0])
+
+        #Single terms give the same values as compiled functions
+        for b, real_branch in [(2, False), (-3, False), (0.5, False), (1/3, True), (2/3, True), (3/5, True), (2.5, False)]:
+            power_term = Power(Constant(2), Constant(b))
+            power_term.set_real_branch(real_branch)
+            compiled = Function([power_term]).compile()
+            for x in [-2.5, -1, 0.5, 3]:
+                try:
+                    expected = compiled(x)
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        power_term.calculate_value(x)
+                    continue
+                self.assertEqual(power_term.calculate_value(x), expected, msg='2 * {x}^{b}'.format(x=x, b=b))
+
+    def test_respecialise(self):
+        power_term = Power(Constant(1), Constant(2))
+        self.assertEqual(power_term.calculate_value(3), 9)
+        power_term.set_b(Constant(0.5))
+        self.assertEqual(power_term.calculate_value(9), 3)
+
+        #Changes to nested terms are seen straight away
+        inner = Power(Constant(1), Constant(1))
+        power_term = Power(inner, Constant(2))
+        self.assertEqual(power_term.calculate_value(2), 8)
+        inner.set_b(Constant(2))
+        self.assertEqual(power_term.calculate_value(2), 16)
+
+
+    def test_real_branch(self):
+        power_term = Power(Constant(1), Constant(1/3))
+        with self.assertRaises(ValueError):
+            power_term.calculate_value(-8) #Complex by default
+
+        power_term.set_real_branch(True)
+        self.assertAlmostEqual(power_term.calculate_value(-8), -2)
+        self.assertAlmostEqual(power_term.calculate_value(27), 3)
+        self.assertEqual(list(power_term.evaluate_many([-1, 0, 1])), [-1, 0, 1])
+        self.assertEqual(power_term.domain(), Domain())
+
+        for b, x, expected in [(2/3, -8, 4), (-1/3, -8, -0.5), (3/5, -32, -8), (-2/5, -32, 0.25)]:
+            power_term = Power(Constant(2), Constant(b))
+            power_term.set_real_branch(True)
+            self.assertAlmostEqual(power_term.calculate_value(x), 2 * expected, msg='2 * {x}^{b}'.format(x=x, b=b))
+
+        #Even roots are still complex
+        power_term = Power(Constant(1), Constant(0.25))
+        power_term.set_real_branch(True)
+        with self.assertRaises(ValueError):
+            power_term.calculate_value(-16)
+
+    def test_function_real_branch(self):
+        f = Function([Power(Constant(1), Constant(1/3)), Power(Constant(1), Power(Constant(1), Constant(1/3)))])
+        key = f.key()
+        f.set_real_branch(True)
+        self.assertNotEqual(f.key(), key)
+        self.assertTrue(f.terms[1].b.real_branch)
+
+        f = Function([Power(Constant(1), Constant(1/3)), Power(Constant(2), Constant(1/3))])
+        f.set_real_branch(True)
+        self.assertAlmostEqual(f.simplify().calculate_value(-8), -6)
+
+        line = FunctionLine(f)
+        line.generate_coordinates(-8, 8)
+        self.assertEqual(sum(line.coordinates.valid()), len(line.coordinates))
+
+    def test_direct_assignment(self):
+        power_term = Power(Constant(1), Constant(2))
+        f = Function([power_term])
+        self.assertEqual(f.calculate_value(2.0), 4.0)
+
+        #The scalar and compiled values agree after b is changed without set_b
+        for change, expected in [(lambda: setattr(power_term, 'b', Constant(3)), 8.0),
+                                 (lambda: setattr(power_term.b, 'value', 4), 16.0),
+                                 (lambda: setattr(power_term, 'b', Power(Constant(1), Constant(0))), 2.0)]:
+            change()
+            self.assertEqual(f.calculate_value(2.0), expected)
+            self.assertEqual(f.compile()(2.0), expected)
+            self.assertEqual(list(f.evaluate_many([2.0])), [expected])
+
+        power_term = Power(Constant(1), Constant(1/3))
+        power_term.real_branch = True
+        self.assertAlmostEqual(power_term.calculate_value(-8), -2)
+
+
 class TestNestedTerms(unittest.TestCase):
 
     #1x^(x^2)
@@ -239,6 +358,311 @@ class TestFunctions(unittest.TestCase):
 
         self.assertEqual(str(f), 'f(x) = 1 + 3x^(7)', 'Should be \'f(x) = 1 + 3x^(7)\'')
 
+class TestSimplify(unittest.TestCase):
+
+    def test_simplify(self):
+        f = Function([
+            Power(Constant(2), Constant(1)), Constant(1), Power(Constant(3), Constant(1)), Constant(2.5),
+            Power(Constant(4), Constant(0)), Power(Constant(1), Constant(2)), Power(Constant(-1), Constant(2)),
+            Power(Constant(1), Power(Constant(1), Constant(2)))
+            ], 'y')
+        simplified = f.simplify()
+        self.assertEqual(str(simplified), 'f(y) = 5x^(1) + 7.5 + 1x^(1x^(2))')
+
+        for x in [-2, -1, 0, 1, 3]:
+            self.assertEqual(simplified.calculate_value(x), f.calculate_value(x))
+
+        self.assertEqual(len(f.terms), 8) #The original is unchanged
+
+    def test_domain_kept(self):
+        f = Function([Power(Constant(1), Constant(0.5)), Power(Constant(-1), Constant(0.5)), Constant(1)])
+        simplified = f.simplify()
+        self.assertEqual(str(simplified), 'f(x) = 0x^(0.5) + 1')
+        self.assertEqual(simplified.calculate_value(4), 1)
+        with self.assertRaises(ValueError):
+            simplified.calculate_value(-4) #Still undefined for x < 0
+
+        self.assertEqual(str(Function([Power(Constant(2), Constant(3)), Power(Constant(-2), Constant(3))]).simplify()), 'f(x) = 0')
+        self.assertEqual(str(Function([]).simplify()), 'f(x) = undefined')
+
+    def test_auto_simplify(self):
+        power_term = Power(Constant(1), Constant(2))
+        line = FunctionLine(Function([power_term, Power(Constant(2), Constant(2))]))
+        line.auto_simplify = True
+        line.cache = None
+        line.generate_coordinates(-2, 2)
+        self.assertEqual(str(line.simplified), 'f(x) = 3x^(2)')
+        self.assertEqual(line.coordinates[0].get_y(), 12)
+
+        power_term.set_b(Constant(3))
+        line.generate_coordinates(-2, 2)
+        self.assertEqual(line.coordinates[0].get_y(), -8 + 8)
+
+class TestFrozen(unittest.TestCase):
+
+    def test_interning(self):
+        square = Power(Constant(1), Constant(2)).freeze()
+        f = Function([Constant(1), Power(Constant(1), Constant(2))]).freeze()
+        self.assertIs(f.terms[1], square)
+        self.assertIs(Function([Constant(1), square]).freeze(), f)
+        self.assertIsNot(Function([Constant(1), square], 't').freeze(), f)
+        self.assertIsNot(Constant(1).freeze(), Constant(1.0).freeze())
+
+        cache = {f: 'cached'}
+        self.assertEqual(cache[Function([Constant(1), Power(Constant(1), Constant(2))]).freeze()], 'cached')
+
+    def test_real_branch(self):
+        #Frozen terms in a mutable function are replaced rather than changed
+        root = Power(Constant(1), Constant(1/3)).freeze()
+        nested = Power(Constant(1), Power(Constant(1), Constant(1/3)).freeze())
+        f = Function([Power(Constant(1), Constant(1/3)), root, nested])
+        value = f.evaluate_many([-8])[0]
+        self.assertTrue(value != value)
+
+        f.set_real_branch(True)
+        self.assertFalse(root.real_branch)
+        self.assertTrue(f.terms[0].real_branch)
+        self.assertIs(f.terms[1], root.with_real_branch(True))
+        self.assertTrue(nested.b.real_branch)
+        self.assertAlmostEqual(f.calculate_value(-8), -4 + (-8) ** -2)
+        self.assertAlmostEqual(f.evaluate_many([-8])[0], -4 + (-8) ** -2)
+
+    def test_immutable(self):
+        f = Function([Power(Constant(3), Constant(2))]).freeze()
+        with self.assertRaises(AttributeError):
+            f.add_term(Constant(1))
+        with self.assertRaises(AttributeError):
+            f.terms[0].set_b(Constant(3))
+        with self.assertRaises(AttributeError):
+            f.terms[0].a.value = 4
+
+        self.assertEqual(f.calculate_value(2), 12)
+        self.assertEqual(f.compile()(2), 12)
+
+    def test_builders(self):
+        f = Function([Power(Constant(3), Constant(2))]).freeze()
+        g = f.with_term(Constant(1))
+        self.assertEqual(g.calculate_value(2), 13)
+        self.assertEqual(f.calculate_value(2), 12)
+        self.assertIs(g.without_term(1), f)
+        self.assertEqual(g.with_name('t').name, 't')
+        self.assertIs(f.terms[0].with_b(Constant(3)), Power(Constant(3), Constant(3)).freeze())
+
+        thawed = g.thaw()
+        self.assertEqual(thawed.key(), g.key())
+        thawed.terms[0].set_b(Constant(3))
+        self.assertEqual(g.calculate_value(2), 13)
+
+    def test_separate_default_terms(self):
+        f = Function()
+        g = Function()
+        f.add_term(Constant(1))
+        self.assertEqual(len(g.terms), 0)
+
+
+class TestEvaluateMany(unittest.TestCase):
+
+    def test_matches_calculate_value(self):
+        xs = [-3, -2, -1, 0, 0.5, 1, 2, 4.25]
+        functions = [
+            Function([Constant(7), Power(Constant(3), Constant(2))]),
+            Function([Power(Constant(1), Power(Constant(1), Constant(2)))]),
+            Function([Power(Constant(-2), Constant(3)), Constant(0.5)])
+            ]
+
+        for f in functions:
+            values = f.evaluate_many(xs)
+            self.assertEqual(len(values), len(xs))
+            for x, y in zip(xs, values):
+                self.assertEqual(y, f.calculate_value(x), '{f} at x={x}'.format(f=f, x=x))
+
+    def test_undefined(self):
+        values = Function([Power(Constant(1), Constant(0.5))]).evaluate_many([-4, 0, 4])
+        self.assertTrue(values[0] != values[0]) #sqrt(-4) is complex so should be NaN
+        self.assertEqual(list(values[1:]), [0, 2])
+
+        values = Function([Power(Constant(1), Constant(-1))]).evaluate_many([0, 2])
+        self.assertTrue(values[0] != values[0]) #1/0 should be NaN
+        self.assertEqual(values[1], 0.5)
+
+        values = Function([]).evaluate_many([1, 2])
+        self.assertTrue(all(y != y for y in values)) #Function is undefined
+
+        with self.assertRaises(TypeError):
+            Function([Constant(1)]).evaluate_many(['1'])
+
+class TestCompile(unittest.TestCase):
+
+    def test_matches_calculate_value(self):
+        f = Function([Constant(7), Power(Constant(-3), Constant(2)), Power(Constant(1), Power(Constant(1), Constant(2)))])
+        compiled = f.compile()
+        for x in [-3, -1, 0, 0.5, 2, 3]:
+            self.assertEqual(compiled(x), f.calculate_value(x), 'f({x})'.format(x=x))
+
+        self.assertIs(f.compile(), compiled) #Unchanged terms should reuse the compiled form
+
+    def test_undefined(self):
+        compiled = Function([Power(Constant(1), Constant(0.5))]).compile()
+        with self.assertRaises(ValueError):
+            compiled(-4) #Complex result
+
+        compiled = Function([Power(Constant(1), Constant(-1))]).compile()
+        with self.assertRaises(ZeroDivisionError):
+            compiled(0)
+
+        compiled = Function([]).compile()
+        with self.assertRaises(ValueError):
+            compiled(1) #Function is undefined
+
+    def test_invalidation(self):
+        power_term = Power(Constant(1), Constant(2))
+        f = Function([power_term])
+        self.assertEqual(f.compile()(3), 9)
+
+        power_term.set_b(Constant(3))
+        self.assertEqual(f.compile()(3), 27)
+
+        power_term.set_a(Constant(2))
+        self.assertEqual(f.compile()(3), 54)
+
+        f.add_term(Constant(1))
+        self.assertEqual(f.compile()(3), 55)
+
+        f.remove_term(0)
+        self.assertEqual(f.compile()(3), 1)
+
+
+class TestPolynomial(unittest.TestCase):
+
+    def test_detection(self):
+        f = Function([Power(Constant(3), Constant(2)), Constant(1), Power(Constant(2), Constant(2)), Power(Constant(4), Constant(0))])
+        self.assertEqual(f.as_polynomial().coefficients, {2: 5, 0: 5})
+
+        self.assertIsNone(Function([Power(Constant(1), Constant(0.5))]).as_polynomial())
+        self.assertIsNone(Function([Power(Constant(1), Constant(-1))]).as_polynomial())
+        self.assertIsNone(Function([Power(Constant(1), Power(Constant(1), Constant(2)))]).as_polynomial())
+        self.assertIsNone(Function([]).as_polynomial())
+
+    def test_dense(self):
+        p = Polynomial({3: -2, 2: 1, 0: 7})
+        self.assertTrue(p.is_dense())
+        for x in [-3, -1, 0, 2, 5]:
+            self.assertEqual(p.calculate_value(x), -2*x**3 + x**2 + 7)
+
+    def test_sparse(self):
+        p = Polynomial({1000: 1, 0: 1})
+        self.assertFalse(p.is_dense())
+        self.assertEqual(p.calculate_value(2), 2**1000 + 1) #Integers stay exact
+        self.assertEqual(p.calculate_value(-1), 2)
+        self.assertAlmostEqual(p.calculate_value(1.001), 1.001**1000 + 1)
+
+        values = p.evaluate_many([0, 1, 0.5])
+        self.assertEqual(list(values), [1, 2, 0.5**1000 + 1])
+
+    def test_overflow(self):
+        #Multiplying overflows to inf where x**1000 would raise, but both are undefined
+        f = Function([Power(Constant(1), Constant(1000)), Constant(1)])
+        with self.assertRaises(OverflowError):
+            f.calculate_value(3.3)
+        values = f.evaluate_many([3.3, 3, 1])
+        self.assertTrue(values[0] != values[0])
+        self.assertTrue(values[1] != values[1])
+        self.assertEqual(values[2], 2)
+
+    def test_compiled_function(self):
+        f = Function([Power(Constant(5), Constant(40)), Power(Constant(2), Constant(13)), Constant(1)])
+        compiled = f.compile()
+        for x in [-1, 0, 1, 2, 3]:
+            self.assertEqual(compiled(x), f.calculate_value(x))
+
+        self.assertEqual(list(f.evaluate_many([1, 0.5])), [8, 5 * 0.5**40 + 2 * 0.5**13 + 1])
+
+
+class TestDomain(unittest.TestCase):
+
+    class RootTerm(Term):
+        """x^(0.5) that records the x values it was evaluated for."""
+
+        def __init__(self):
+            self.xs = []
+
+        def calculate_value(self, x):
+            self.xs.append(x)
+            return Power(Constant(1), Constant(0.5)).calculate_value(x)
+
+        def domain(self):
+            return Domain([(0, inf, True, False)])
+
+    def test_power(self):
+        self.assertEqual(Power(Constant(2), Constant(3)).domain(), Domain())
+        self.assertEqual(Power(Constant(2), Constant(-2)).domain(), Domain([(-inf, 0, False, False), (0, inf, False, False)]))
+        self.assertEqual(Power(Constant(2), Constant(1.5)).domain(), Domain([(0, inf, True, False)]))
+        self.assertEqual(Power(Constant(2), Constant(-0.5)).domain(), Domain([(0, inf, False, False)]))
+
+        #Only the domain of the exponent is known
+        self.assertEqual(Power(Constant(1), Power(Constant(1), Constant(-1))).domain(), Power(Constant(1), Constant(-1)).domain())
+
+    def test_function(self):
+        f = Function([Power(Constant(1), Constant(-1)), Power(Constant(1), Constant(0.5))])
+        domain = f.domain()
+        self.assertEqual(domain.intervals, [(0, inf, False, False)])
+        self.assertEqual([domain.contains(x) for x in [-1, 0, 0.5, 9]], [False, False, True, True])
+
+        for x in [-3, -1, 0, 0.5, 2]:
+            if not domain.contains(x):
+                self.assertRaises(Exception, f.calculate_value, x)
+
+        self.assertTrue(Function([]).domain().is_empty())
+
+    def test_intersect(self):
+        a = Domain([(-5, 0, True, True), (2, 4, False, True)])
+        b = Domain([(0, 3, True, False)])
+        self.assertEqual(a.intersect(b).intervals, [(0, 0, True, True), (2, 3, False, False)])
+        self.assertTrue(a.intersect(Domain([(0, 2, False, True)])).is_empty())
+
+    def test_index_ranges(self):
+        domain = Domain([(-inf, 0, False, False), (1, 2, True, True)])
+        self.assertEqual(domain.index_ranges([-1, 0, 0.5, 1, 1.5, 2, 3]), [(0, 1), (3, 6)])
+
+    def test_contains_range(self):
+        domain = Domain([(-inf, 0, False, False), (1, 2, True, True)])
+        self.assertTrue(domain.contains_range(-2, -1))
+        self.assertTrue(domain.contains_range(2, 1))
+        self.assertFalse(domain.contains_range(-1, 1))
+        self.assertFalse(domain.contains_range(-1, 0))
+        self.assertFalse(domain.contains_range(1.5, 3))
+
+    def test_sampling_skips_undefined(self):
+        term = TestDomain.RootTerm()
+        line = FunctionLine(Function([term]))
+        line.cache = None
+        line.no_sublines = 100
+        line.generate_coordinates(-10, 10)
+
+        self.assertEqual(len(line.coordinates), 101)
+        self.assertTrue(all(x >= 0 for x in term.xs))
+        self.assertEqual(len(term.xs), 51)
+        self.assertIsNone(line.coordinates[0].get_y())
+        self.assertEqual(line.coordinates[100].get_y(), 10**0.5)
+
+        term.xs = []
+        line.set_sampling('adaptive')
+        line.generate_coordinates(-10, 10, (20, 10), (-30, 30))
+        self.assertTrue(all(x >= 0 for x in term.xs))
+
+    def test_sampling_in_batches(self):
+        calls = []
+        def evaluate_many(xs):
+            calls.append(list(xs))
+            return array('d', [2 * x for x in xs])
+
+        domain = Domain([(-inf, -1, False, True), (1, inf, True, False)])
+        coordinates = grapher._sample_uniform(evaluate_many, -2, 2, 4, domain)
+
+        #Each defined span is evaluated in one call
+        self.assertEqual(calls, [[-2, -1], [1, 2]])
+        self.assertEqual([c.get_y() for c in coordinates], [-4, -2, None, 2, 4])
+
 
 class TestCoordinates(unittest.TestCase):
 
@@ -298,6 +722,809 @@ class TestCoordinates(unittest.TestCase):
         self.assertTrue(not c.in_range(2, 3, 4, 5)) #Too small
         self.assertTrue(not c.in_range(-5, -4, -3, -2)) #Too large
 
+class TestAdaptiveSampling(unittest.TestCase):
+
+    class CountingTerm(Term):
+        """x^2 that records the x values it was evaluated for."""
+
+        def __init__(self):
+            self.xs = []
+
+        def calculate_value(self, x):
+            self.xs.append(x)
+            return x * x
+
+    def test_linear(self):
+        for f in [Function([Constant(6)]), Function([Power(Constant(1), Constant(1)), Constant(1)])]:
+            line = FunctionLine(f)
+            line.set_sampling('adaptive')
+            line.generate_coordinates(-20, 20, (20, 10), (-30, 30))
+            self.assertTrue(len(line.coordinates) <= 2 * line.initial_intervals + 1)
+
+    def test_curve(self):
+        term = TestAdaptiveSampling.CountingTerm()
+        line = FunctionLine(Function([term]))
+        line.set_sampling('adaptive', tolerance=0.5)
+        line.generate_coordinates(-5, 5, (20, 10), (-30, 30))
+
+        self.assertEqual(len(term.xs), len(set(term.xs)), 'No x should be evaluated twice')
+        self.assertEqual(len(term.xs), len(line.coordinates))
+
+        xs = [c.get_x() for c in line.coordinates]
+        self.assertEqual(xs, sorted(xs))
+        self.assertEqual((xs[0], xs[-1]), (-5, 5))
+
+        #Every midpoint between adjacent samples is within tolerance of the chord
+        for c1, c2 in zip(line.coordinates, line.coordinates[1:]):
+            xm = (c1.get_x() + c2.get_x()) / 2
+            self.assertTrue(abs(xm * xm - (c1.get_y() + c2.get_y()) / 2) * 10 <= 0.5)
+
+    def test_limits(self):
+        line = FunctionLine(Function([Power(Constant(1), Constant(-1))]))
+        line.set_sampling('adaptive', max_samples=50)
+        line.generate_coordinates(-20, 20, (20, 10), (-30, 30))
+        self.assertTrue(len(line.coordinates) <= 50)
+
+        with self.assertRaises(ValueError):
+            line.set_sampling('random')
+        with self.assertRaises(ValueError):
+            line.set_sampling('adaptive', tolerance=0)
+        with self.assertRaises(ValueError):
+            line.set_sampling('adaptive', max_samples=1)
+
+class RecordingCanvas:
+    """Stands in for a tkinter.Canvas, keeping the points of each line created."""
+
+    def __init__(self):
+        self.items = {}
+        self.created = 0
+
+    def create_line(self, *points, fill=None):
+        if len(points) == 1:
+            points = points[0]
+        self.created += 1
+        self.items[self.created] = list(points)
+        return self.created
+
+    def coords(self, item, points):
+        self.items[item] = list(points)
+
+    def itemconfigure(self, item, **options):
+        pass
+
+    def delete(self, *items):
+        for item in items:
+            del self.items[item]
+
+    def tag_lower(self, item):
+        pass
+
+    def pack(self):
+        pass
+
+class StubGraph(Graph):
+    """A Graph that draws on a RecordingCanvas instead of opening a window."""
+
+    def __init__(self, height=600, width=800):
+        super().__init__(None, height, width, RecordingCanvas())
+
+class TestPolyline(unittest.TestCase):
+
+    def test_runs(self):
+        line = FunctionLine(Function([Power(Constant(1), Constant(-1))]))
+        line.coordinates = CoordinateBuffer()
+        for x, y in [(0, 0), (1, 1), (2, None), (3, 3), (4, 4), (5, 5), (6, 50), (7, 7)]:
+            line.coordinates.append(x, y)
+        self.assertEqual(line.runs(0, 0, 10, 10), [(0, 2), (3, 6)])
+
+    def test_draw(self):
+        graph = StubGraph()
+        line = FunctionLine(Function([Power(Constant(1), Constant(0.5))]))
+        line.vertex_tolerance = None
+        line.draw(graph, -20, -30, 20, 30)
+
+        #sqrt(x) is one continuous run for x >= 0
+        self.assertEqual(len(line.sublines), 1)
+        points = graph.canvas.items[line.sublines[0]]
+        self.assertEqual(len(points), 2 * 251)
+        self.assertEqual(points[:2], [400, 300])
+
+        segments = FunctionLine(line.function)
+        segments.polyline = False
+        segments.vertex_tolerance = None
+        segments.draw(graph, -20, -30, 20, 30)
+        self.assertEqual(len(segments.sublines), 250)
+
+    def test_clip(self):
+        coordinates = CoordinateBuffer()
+        for x, y in [(0, 0), (1, 5), (2, 20), (3, 5), (4, None), (5, 5), (6, 6)]:
+            coordinates.append(x, y)
+        clipped, runs = coordinates.clip(0, 0, 10, 10)
+
+        #The segments leaving and re-entering the range are cut at y = 10
+        self.assertEqual(runs, [(0, 3), (3, 5), (5, 7)])
+        self.assertEqual(list(clipped.xs), [0, 1, 4 / 3, 8 / 3, 3, 5, 6])
+        self.assertEqual(list(clipped.ys), [0, 5, 10, 10, 5, 5, 6])
+
+        #A segment crossing the whole range is kept between the edges
+        coordinates = CoordinateBuffer()
+        coordinates.append(-5, -5)
+        coordinates.append(15, 15)
+        clipped, runs = coordinates.clip(0, 0, 10, 10)
+        self.assertEqual(runs, [(0, 2)])
+        self.assertEqual(list(clipped.xs), [0, 10])
+
+        #A segment across a gap in the domain is left out
+        coordinates = CoordinateBuffer()
+        for x, y in [(-2, -0.5), (-1, -1), (1, 1), (2, 0.5)]:
+            coordinates.append(x, y)
+        domain = Domain([(-inf, 0, False, False), (0, inf, False, False)])
+        clipped, runs = coordinates.clip(-10, -10, 10, 10, domain)
+        self.assertEqual(runs, [(0, 2), (2, 4)])
+
+    def test_draw_across_pole(self):
+        graph = StubGraph()
+        line = FunctionLine(Function([Power(Constant(1), Constant(-1))]))
+        graph.add_line(line)
+        #After panning no sample lands on the pole at x = 0
+        graph.pan(7, 0)
+        graph.plot()
+        for subline in line.sublines:
+            points = graph.canvas.items[subline]
+            #No part of the line is drawn through x = 0 at pixel 407
+            self.assertTrue(max(points[0::2]) < 407 or min(points[0::2]) > 407)
+
+    def test_draw_to_edge(self):
+        graph = StubGraph()
+        line = FunctionLine(Function([Power(Constant(1), Constant(3))]))
+        line.draw(graph, -20, -30, 20, 30)
+        points = graph.canvas.items[line.sublines[0]]
+        #x^3 reaches the top and bottom of the graph
+        self.assertEqual(max(points[1::2]), 600)
+        self.assertEqual(min(points[1::2]), 0)
+
+        unclipped = FunctionLine(line.function)
+        unclipped.clip = False
+        unclipped.draw(graph, -20, -30, 20, 30)
+        points = graph.canvas.items[unclipped.sublines[0]]
+        self.assertLess(max(points[1::2]), 600)
+
+    def test_simplify(self):
+        #Repeated pixels and points on a straight line are dropped
+        xs, ys = grapher._simplify_run(array('d', [0, 0, 1, 2, 3, 3, 4]), array('d', [0, 0, 1, 2, 3, 3, 0]), 0.5)
+        self.assertEqual(list(xs), [0, 3, 4])
+        self.assertEqual(list(ys), [0, 3, 0])
+
+        #Points within the tolerance of the line are dropped
+        xs, ys = grapher._simplify_run(array('d', [0, 1, 2, 3]), array('d', [0, 1, 0, 0]), 2)
+        self.assertEqual(list(xs), [0, 3])
+        xs, ys = grapher._simplify_run(array('d', [0, 1, 2, 3]), array('d', [0, 1, 0, 0]), 0.5)
+        self.assertEqual(list(xs), [0, 1, 3])
+
+        #A run on a single pixel keeps both ends
+        xs, ys = grapher._simplify_run(array('d', [5, 5, 5]), array('d', [7, 7, 7]), 0.5)
+        self.assertEqual((list(xs), list(ys)), ([5, 5], [7, 7]))
+
+    def test_draw_simplified(self):
+        graph = StubGraph()
+        graph.enable_stats()
+        line = FunctionLine(Function([Power(Constant(1), Constant(1))]))
+        line.draw(graph, -20, -30, 20, 30)
+
+        #y = x is drawn from end to end as one segment
+        self.assertEqual(graph.canvas.items[line.sublines[0]], [0, 500, 800, 100])
+        self.assertEqual(line.removed_vertices, 499)
+        self.assertEqual(graph.stats.lines[line]['removed_vertices'], 499)
+
+class TestPlotStats(unittest.TestCase):
+
+    def test_disabled(self):
+        graph = StubGraph(200, 200)
+        graph.add_line(FunctionLine(Function([Power(Constant(1), Constant(2))])))
+        graph.plot()
+        self.assertIsNone(graph.stats)
+
+    def test_collect(self):
+        graph = StubGraph(200, 200)
+        root = FunctionLine(Function([Power(Constant(1), Constant(0.5)), Constant(1)]))
+        root.cache = None
+        root.no_sublines = 100
+        graph.add_line(root)
+        graph.add_axes()
+
+        events = []
+        stats = graph.enable_stats(profile_terms=True)
+        stats.add_hook(lambda name, line, value: events.append((name, line)))
+        graph.plot()
+
+        for stage in ['plot', 'draw', 'generate', 'convert', 'range', 'create_line']:
+            self.assertIn(stage, stats.stages)
+        self.assertEqual(stats.lines[root]['samples'], 101)
+        self.assertEqual(stats.lines[root]['invalid'], 50)
+        self.assertEqual(stats.lines[root]['items'], len(root.sublines))
+        self.assertEqual(set(stats.term_costs), {'1x^(0.5)', '1'})
+        self.assertIn(('plot', None), events)
+        self.assertIn(('samples', root), events)
+        json.dumps(stats.as_dict())
+
+        root.mark_dirty()
+        graph.plot()
+        self.assertEqual(stats.lines[root]['samples'], 202)
+        stats.reset()
+        self.assertEqual(stats.lines, {})
+
+        graph.disable_stats()
+        graph.plot()
+        self.assertEqual(stats.lines, {})
+
+
+class TestProgressive(unittest.TestCase):
+
+    def test_passes(self):
+        graph = StubGraph()
+        renderer = graph.enable_progressive(passes=(8,), poll_interval=None)
+        line = FunctionLine(Function([Power(Constant(1), Constant(2))]))
+        line.cache = None
+        graph.add_line(line)
+        graph.plot()
+        self.assertEqual(line.sublines, [])
+
+        #The coarse pass is drawn first, then the line's own sampling
+        renderer.apply(renderer.results.get(timeout=5))
+        self.assertEqual(len(line.coordinates), 9)
+        self.assertIsNone(line.drawn_key)
+        self.assertTrue(renderer.wait(5))
+        self.assertEqual(len(line.coordinates), 501)
+        self.assertEqual(len(line.sublines), 1)
+        self.assertEqual(renderer.in_flight, {})
+
+        #Nothing is sampled again until something changes
+        graph.plot()
+        self.assertEqual(renderer.in_flight, {})
+        graph.disable_progressive()
+
+    def test_cancel(self):
+        graph = StubGraph()
+        renderer = graph.enable_progressive(poll_interval=None)
+        line = FunctionLine(Function([Power(Constant(1), Constant(2))]))
+        graph.add_line(line)
+        graph.plot()
+        first = renderer.in_flight[line][1]
+
+        line.function.terms[0].set_b(Constant(3))
+        graph.plot()
+        self.assertTrue(first.cancelled)
+        self.assertTrue(renderer.wait(5))
+        self.assertEqual(line.drawn_key, line.draw_key(graph, *graph.get_viewport()))
+        self.assertEqual(line.coordinates.ys[-1], 20 ** 3)
+        graph.disable_progressive()
+
+    def test_cancel_during_pass(self):
+        for sampling in ['uniform', 'adaptive', 'tiled']:
+            term = TestAdaptiveSampling.CountingTerm()
+            line = FunctionLine(Function([term]))
+            line.set_sampling(sampling)
+            line.cache = SampleCache()
+            line.tiles = SampleCache()
+            token = CancelToken()
+            calculate_value = term.calculate_value
+
+            #The token is cancelled by the first value calculated
+            def cancelling(x):
+                token.cancel()
+                return calculate_value(x)
+            term.calculate_value = cancelling
+
+            with self.assertRaises(Cancelled, msg=sampling):
+                line.generate_coordinates(-20, 20, (200, 100), (-30, 30), token=token)
+            self.assertLessEqual(len(term.xs), grapher.CHECK_SAMPLES + 1, msg=sampling)
+            self.assertEqual(len(line.cache), 0, msg=sampling)
+
+    def test_headless(self):
+        #Headless canvases have no after, so passes are drawn by wait
+        graph = Graph(None, 600, 800, SVGCanvas(600, 800))
+        renderer = graph.enable_progressive()
+        self.assertIsNone(renderer.poll_interval)
+        line = FunctionLine(Function([Power(Constant(1), Constant(2))]))
+        graph.add_line(line)
+        graph.plot()
+        self.assertTrue(renderer.wait(5))
+        self.assertEqual(len(line.sublines), 1)
+        graph.disable_progressive()
+
+class TestRetainedDrawing(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = StubGraph(300, 400)
+        self.graph.add_grid_lines()
+        self.graph.add_axes()
+        self.term = Power(Constant(1), Constant(2))
+        self.line = FunctionLine(Function([self.term]))
+        self.graph.add_line(self.line)
+
+    def test_repeated_plots(self):
+        canvas = self.graph.get_canvas()
+        self.graph.plot()
+        items = dict(canvas.items)
+        stats = self.graph.enable_stats()
+
+        for _ in range(3):
+            self.graph.plot()
+        self.assertEqual(canvas.items, items)
+        self.assertNotIn('samples', stats.lines[self.line]) #Unchanged, so not sampled again
+
+        self.graph.redraw()
+        self.assertEqual(stats.lines[self.line]['samples'], self.line.no_sublines + 1)
+        self.assertEqual(canvas.items, items)
+
+    def test_update_in_place(self):
+        canvas = self.graph.get_canvas()
+        self.graph.plot()
+        sublines = list(self.line.sublines)
+        points = canvas.items[sublines[0]]
+
+        self.term.set_a(Constant(2))
+        self.graph.plot()
+        self.assertEqual(self.line.sublines, sublines)
+        self.assertNotEqual(canvas.items[sublines[0]], points)
+
+        self.graph.pan(15, -20)
+        self.graph.plot()
+        self.assertEqual(self.line.sublines, sublines)
+        self.assertEqual(len(canvas.items), len(self.graph.grid.items) + len(sublines))
+
+    def test_surplus_deleted(self):
+        canvas = self.graph.get_canvas()
+        self.line.polyline = False
+        self.graph.plot()
+        self.assertTrue(len(self.line.sublines) > 1)
+
+        self.line.polyline = True
+        self.graph.plot()
+        self.assertEqual(len(self.line.sublines), 1)
+        self.assertEqual(len(canvas.items), len(self.graph.grid.items) + 1)
+
+
+class TestSampleCache(unittest.TestCase):
+
+    def test_threads(self):
+        cache = SampleCache(max_bytes=40 * 16 * 20)
+
+        def work(offset):
+            for i in range(500):
+                cache.put((offset + i) % 50, CoordinateBuffer(range(40), range(40)))
+                cache.get((offset * i) % 50)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        #The size still matches the entries, so eviction keeps within the limit
+        self.assertEqual(cache.size, sum(c.nbytes() for c in cache.entries.values()))
+        self.assertTrue(cache.size <= cache.max_bytes)
+
+    def test_hits(self):
+        cache = SampleCache()
+        power_term = Power(Constant(1), Constant(2))
+        line = FunctionLine(Function([power_term]))
+        line.cache = cache
+
+        line.generate_coordinates(-20, 20)
+        line.generate_coordinates(-20, 20)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        #A second line with the same function shares the samples
+        other = FunctionLine(Function([Power(Constant(1), Constant(2))]))
+        other.cache = cache
+        other.generate_coordinates(-20, 20)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        #Changing the function, range or sampling misses
+        power_term.set_b(Constant(3))
+        line.generate_coordinates(-20, 20)
+        self.assertEqual(line.coordinates[-1].get_y(), 8000)
+        line.generate_coordinates(-10, 10)
+        line.no_sublines = 100
+        line.generate_coordinates(-10, 10)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_copies(self):
+        cache = SampleCache()
+        cache.put('key', CoordinateBuffer([1], [2]))
+        coordinates = cache.get('key')
+        coordinates.swap()
+        self.assertEqual(str(cache.get('key')[0]), '(1.0, 2.0)')
+
+    def test_eviction(self):
+        cache = SampleCache(max_bytes=64)
+        cache.put('a', CoordinateBuffer([1, 2], [1, 2]))
+        cache.put('b', CoordinateBuffer([1, 2], [1, 2]))
+        cache.get('a')
+        cache.put('c', CoordinateBuffer([1, 2], [1, 2]))
+
+        #b was the least recently used
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.size, 64)
+
+        cache.put('d', CoordinateBuffer(range(10), range(10)))
+        self.assertEqual(len(cache), 2) #Too big to be stored
+
+        cache.set_max_bytes(32)
+        self.assertEqual(list(cache.entries), ['c'])
+
+class TestPanZoom(unittest.TestCase):
+
+    def test_viewport(self):
+        graph = StubGraph()
+        self.assertEqual(graph.get_viewport(), (-20, -30, 20, 30))
+
+        graph.pan(40, -20)
+        self.assertEqual(graph.get_viewport(), (-22, -32, 18, 28))
+
+        graph = StubGraph()
+        graph.zoom(2, (600, 300))
+        self.assertEqual(graph.get_viewport(), (-5, -15, 15, 15))
+        self.assertEqual(graph.range, (10, 15))
+
+        #The range only depends on the scale, so panning keeps it
+        graph.pan(40, -20)
+        self.assertEqual(graph.range, (10, 15))
+
+        with self.assertRaises(ValueError):
+            graph.zoom(0)
+
+    def test_tiles(self):
+        term = TestAdaptiveSampling.CountingTerm()
+        line = FunctionLine(Function([term]))
+        line.set_sampling('tiled')
+        line.tiles = SampleCache()
+
+        #At scale 16 each tile is 128 / 16 = 8 units wide
+        line.generate_coordinates(-20, 20, (16, 10))
+        self.assertEqual(len(line.tiles), 6)
+        self.assertEqual(line.coordinates[0].get_x(), -24)
+        self.assertEqual(line.coordinates[-1].get_x(), 24)
+
+        #Panning right by less than a tile only evaluates one more tile
+        evaluated = len(term.xs)
+        line.generate_coordinates(-15, 25, (16, 10))
+        self.assertEqual(len(term.xs) - evaluated, line.tile_samples + 1)
+
+        #Zooming in can preview from the cached level
+        evaluated = len(term.xs)
+        line.generate_coordinates(-10, 10, (32, 10), preview=True)
+        self.assertEqual(len(term.xs), evaluated)
+        line.generate_coordinates(-10, 10, (32, 10))
+        self.assertTrue(len(term.xs) > evaluated)
+
+    def test_tile_widths(self):
+        tiles = SampleCache()
+        narrow = FunctionLine(Function([Power(Constant(1), Constant(1))]))
+        narrow.set_sampling('tiled')
+        narrow.tiles = tiles
+        narrow.generate_coordinates(-20, 20, (20, 10))
+
+        #Lines with wider tiles sharing the cache do not use the narrower tiles
+        wide = FunctionLine(narrow.function)
+        wide.set_sampling('tiled')
+        wide.tiles = tiles
+        wide.tile_pixels = 256
+        wide.generate_coordinates(-20, 20, (20, 10))
+        self.assertEqual(wide.coordinates[0].get_x(), -32)
+        self.assertEqual(wide.coordinates[-1].get_x(), 32)
+
+class TestCoordinateBuffer(unittest.TestCase):
+
+    def test_append(self):
+        buffer = CoordinateBuffer()
+        buffer.append(1, 2)
+        buffer.append(3, None)
+        buffer.append(None, None)
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual([str(c) for c in buffer], ['(1.0, 2.0)', '(3.0, None)', '(None, None)'])
+        self.assertEqual(list(buffer.valid()), [1, 0, 0])
+
+        with self.assertRaises(ValueError):
+            CoordinateBuffer([1, 2], [1])
+
+    def test_range(self):
+        buffer = CoordinateBuffer([1, 1, 5, 0], [2, 9, 2, 2])
+        buffer.append(None, 2)
+        self.assertEqual(list(buffer.in_range(0, 0, 4, 4)), [1, 0, 0, 1, 0])
+
+    def test_swap_transform(self):
+        buffer = CoordinateBuffer([1, -2], [3, float('nan')])
+        buffer.swap()
+        self.assertEqual(str(buffer[0]), '(3.0, 1.0)')
+
+        screen = buffer.transform((400, 300), (20, 10))
+        self.assertEqual((screen.xs[0], screen.ys[0]), (460, 290))
+        self.assertTrue(not screen[1].is_valid())
+
+class TestBackends(unittest.TestCase):
+
+    def draw(self, canvas):
+        graph = Graph(None, 60, 80, canvas)
+        graph.add_axes()
+        graph.add_line(FunctionLine(Function([Power(Constant(1), Constant(1))])), 'red')
+        graph.plot()
+        return graph
+
+    def test_svg(self):
+        graph = self.draw(SVGCanvas(60, 80))
+        stream = io.StringIO()
+        graph.get_canvas().write(stream)
+        svg = stream.getvalue()
+
+        self.assertTrue(svg.startswith('<svg'))
+        self.assertEqual(svg.count('<polyline'), 3)
+        self.assertIn('points="0,30 80,30" fill="none" stroke="black"', svg) #x axis
+
+    def test_png(self):
+        graph = self.draw(RasterCanvas(60, 80))
+        pixels = graph.get_canvas().render()
+        self.assertEqual(len(pixels), 60 * 80 * 3)
+
+        def pixel(x, y):
+            return tuple(pixels[3 * (y * 80 + x):3 * (y * 80 + x) + 3])
+        self.assertEqual(pixel(10, 10), (255, 255, 255))
+        self.assertEqual(pixel(10, 30), (0, 0, 0)) #x axis
+        self.assertEqual(pixel(60, 20), (255, 0, 0)) #y = x at x = 1
+
+        stream = io.BytesIO()
+        graph.get_canvas().write(stream)
+        data = stream.getvalue()
+        self.assertTrue(data.startswith(b'\x89PNG\r\n\x1a\n'))
+        idat = data.index(b'IDAT')
+        length = int.from_bytes(data[idat-4:idat], 'big')
+        self.assertEqual(len(zlib.decompress(data[idat+4:idat+4+length])), 60 * (80 * 3 + 1))
+
+    def test_colours(self):
+        self.assertEqual(parse_colour('#D3D3D3'), (211, 211, 211))
+        self.assertEqual(parse_colour('#fff'), (255, 255, 255))
+        self.assertEqual(parse_colour('Red'), (255, 0, 0))
+        with self.assertRaises(ValueError):
+            parse_colour('not a colour')
+        with self.assertRaises(ValueError):
+            canvas_for('graph.jpg', 10, 10)
+
+class TestBatch(unittest.TestCase):
+
+    def test_specs(self):
+        f = batch.function_from_spec({'terms': [{'power': [3, 2]}, 1], 'name': 'y'})
+        self.assertEqual(str(f), 'f(y) = 3x^(2) + 1')
+
+        for spec in [{'terms': ['1']}, {'terms': [{'power': [1]}]}, {'terms': [True]}, []]:
+            with self.assertRaises(ValueError):
+                batch.function_from_spec(spec)
+
+    def test_run(self):
+        jobs = [
+            {'output': 'a.svg', 'functions': [{'terms': [{'power': [1, 2]}]}]},
+            {'output': 'b.png', 'functions': [{'terms': [1]}], 'width': 40, 'height': 30, 'grid': False},
+            {'output': 'c.svg', 'functions': [{'terms': ['x']}]},
+            {'output': 'd.gif', 'functions': []}
+            ]
+        stream = io.StringIO('\n'.join(json.dumps(job) for job in jobs) + '\n\n')
+        report = io.StringIO()
+
+        with tempfile.TemporaryDirectory() as directory:
+            succeeded, failed = batch.run_batch(stream, report, workers=2, chunk_size=1, output_dir=directory)
+            self.assertEqual(sorted(os.listdir(directory)), ['a.svg', 'b.png'])
+
+        self.assertEqual((succeeded, failed), (2, 2))
+        results = sorted((json.loads(line) for line in report.getvalue().splitlines()), key=lambda r: r['job'])
+        self.assertEqual([r['job'] for r in results], [1, 2, 3, 4])
+        self.assertIsNone(results[0]['error'])
+        self.assertTrue(results[2]['error'].startswith('ValueError'))
+        self.assertTrue(results[3]['error'].startswith('ValueError'))
+
+class TestParsing(unittest.TestCase):
+
+    def test_round_trip(self):
+        functions = [
+            Function([Constant(7), Power(Constant(-3), Constant(2)), Power(Constant(1), Power(Constant(1), Constant(2)))]),
+            Function([Power(Power(Constant(1.5), Constant(2)), Constant(-0.5)), Constant(1e-05), Constant(inf)], 't'),
+            Function([], 'y')
+            ]
+        for f in functions:
+            parsed = parsing.parse(str(f))
+            self.assertEqual(parsed.key(), f.key(), str(f))
+            self.assertEqual(parsed.name, f.name)
+
+    def test_variants(self):
+        for text, expected in [
+                ('3x^2 + x^(-1) + 5', [Power(Constant(3), Constant(2)), Power(Constant(1), Constant(-1)), Constant(5)]),
+                ('2*x**3 - x', [Power(Constant(2), Constant(3)), Power(Constant(-1), Constant(1))]),
+                ('t^0.5 - -1', [Power(Constant(1), Constant(0.5)), Constant(1)]),
+                ('-x^-2', [Power(Constant(-1), Constant(-2))])
+                ]:
+            self.assertEqual(parsing.parse(text).key(), Function(expected).key(), text)
+
+        self.assertEqual(parsing.parse_term('2x^(x)').key(), Power(Constant(2), Power(Constant(1), Constant(1))).key())
+
+        for text in ['3 +', 'x^', 'x + y', '3 $ 4', '(x', '']:
+            with self.assertRaises(ValueError):
+                parsing.parse(text)
+
+    def test_fresh_terms(self):
+        #Cached strings still give separate terms that can be changed
+        f = parsing.parse('x^2 + 1')
+        g = parsing.parse('x^2 + 1')
+        f.terms[0].set_b(Constant(3))
+        self.assertEqual(g.calculate_value(2), 5)
+
+    def test_lines(self):
+        lines = io.StringIO('x^2\n\n2x + 1\nx +\n')
+        functions = parsing.parse_lines(lines)
+        self.assertEqual(next(functions).calculate_value(3), 9)
+        self.assertEqual(next(functions).calculate_value(3), 7)
+        with self.assertRaisesRegex(ValueError, 'Line 4'):
+            next(functions)
+
+
+class TestExport(unittest.TestCase):
+
+    def test_iter_values(self):
+        f = Function([Power(Constant(1), Constant(0.5)), Constant(1)])
+        chunks = list(f.iter_values(-4, 4, 8, chunk=4))
+        self.assertEqual([len(xs) for xs, ys in chunks], [4, 4, 1])
+
+        #The same points a line samples, NaN where f(x) is undefined
+        line = FunctionLine(f)
+        line.cache = None
+        line.no_sublines = 8
+        line.generate_coordinates(-4, 4)
+        self.assertEqual([x for xs, ys in chunks for x in xs], list(line.coordinates.xs))
+        ys = [y for xs, ys in chunks for y in ys]
+        self.assertTrue(all(y != y for y in ys[:4]))
+        self.assertEqual(ys[4:], [1, 2, 1 + 2 ** 0.5, 1 + 3 ** 0.5, 3])
+        self.assertEqual(line.coordinates.valid(), bytearray(y == y for y in ys))
+
+        with self.assertRaises(ValueError):
+            next(f.iter_values(0, 1, 0))
+
+    def test_write_table(self):
+        f = Function([Power(Constant(1), Constant(-1))])
+        stream = io.StringIO()
+        self.assertEqual(export.write_table(f, -1, 1, 4, stream, chunk=2), 5)
+        self.assertEqual(stream.getvalue(), 'x,f(x)\n-1.0,-1.0\n-0.5,-2.0\n0.0,\n0.5,2.0\n1.0,1.0\n')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'values.tsv')
+            export.export(f, 1, 2, 1, path, header=False)
+            with open(path) as stream:
+                self.assertEqual(stream.read(), '1.0\t1.0\n2.0\t0.5\n')
+
+class TestSerialization(unittest.TestCase):
+
+    def functions(self):
+        real = Power(Constant(-1.5), Constant(1/3))
+        real.set_real_branch(True)
+        return [
+            Function([Constant(7), Power(Constant(-3), Constant(2))]),
+            Function([Power(Constant(2**70), Power(Constant(1), Constant(-300))), real], 't'),
+            Function([Constant(inf)]),
+            Function([], 'y')
+            ]
+
+    def test_round_trip(self):
+        functions = self.functions()
+        corpus = serialization.FunctionCorpus(serialization.dumps(functions))
+        self.assertEqual(len(corpus), len(functions))
+        self.assertEqual(corpus.version, serialization.VERSION)
+
+        for original, loaded in zip(functions, corpus):
+            self.assertEqual(loaded.key(), original.key())
+            self.assertEqual(loaded.name, original.name)
+        self.assertEqual(corpus[-1].name, 'y')
+        self.assertEqual(str(corpus[1].terms[0]), str(functions[1].terms[0]))
+
+        function, end = serialization.decode_function(serialization.encode_function(functions[0]))
+        self.assertEqual(function.key(), functions[0].key())
+
+    def test_file(self):
+        functions = self.functions() * 10
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'functions.pygf')
+            serialization.dump(functions, path)
+            with serialization.load(path) as corpus:
+                self.assertEqual([f.key() for f in corpus[::10]], [f.key() for f in functions[::10]])
+                self.assertEqual(corpus[24].calculate_value(-8), functions[24].calculate_value(-8))
+
+    def test_invalid(self):
+        data = serialization.dumps(self.functions())
+        with self.assertRaises(ValueError):
+            serialization.FunctionCorpus(b'GIF89a' + data)
+        with self.assertRaises(ValueError):
+            serialization.FunctionCorpus(data[:4] + bytes([9, 0]) + data[6:]) #Unknown version
+        with self.assertRaises(ValueError):
+            serialization.FunctionCorpus(data[:-3])[3]
+        with self.assertRaises(IndexError):
+            serialization.FunctionCorpus(data)[4]
+
+        class Other(Term):
+            def calculate_value(self, x):
+                return x
+
+        with self.assertRaises(TypeError):
+            serialization.encode_function(Function([Other()]))
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        functions = [('square', Function([Power(Constant(1), Constant(2))]))]
+        results = benchmark.run_benchmarks(sample_counts=(10,), repeat=1, functions=functions)
+        names = {result['name']: result for result in results}
+
+        self.assertIn('generate_coordinates/square/10', names)
+        self.assertEqual(names['draw_sublines/square/10']['items'], 1)
+        self.assertTrue(names['plot_grid']['items'] > 0)
+        for result in results:
+            self.assertTrue(result['seconds'] >= 0 and result['peak_bytes'] >= 0)
+
+        json.dumps(benchmark.report(results))
+
+    def test_compare(self):
+        baseline = [{'name': 'a', 'seconds': 1.0, 'peak_bytes': 100, 'items': 3},
+                    {'name': 'b', 'seconds': 1.0, 'peak_bytes': 100, 'items': None}]
+        results = [{'name': 'a', 'seconds': 1.1, 'peak_bytes': 100, 'items': 3},
+                   {'name': 'b', 'seconds': 2.0, 'peak_bytes': 300, 'items': 1},
+                   {'name': 'c', 'seconds': 9.0, 'peak_bytes': 900, 'items': None}]
+        regressions = benchmark.compare(results, baseline, threshold=1.25)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(regression.startswith('b:') for regression in regressions))
+
+
+class TestGridLayer(unittest.TestCase):
+
+    def test_step(self):
+        grid = GridLayer()
+        self.assertEqual(grid.step(20), 5) #Same as the original 5 unit grid
+        self.assertEqual(grid.step(10), 5)
+        self.assertEqual(grid.step(50), 1)
+        self.assertEqual(grid.step(30), 2)
+        self.assertAlmostEqual(grid.step(1000), 0.05)
+        self.assertEqual(grid.step(0.001), 50000)
+        self.assertEqual(grid.ticks(-7, 12, 20), [-5, 0, 5, 10])
+
+    def test_draw(self):
+        graph = StubGraph(300, 400)
+        graph.add_grid_lines()
+        graph.add_axes()
+        self.assertEqual(graph.lines, [])
+
+        for factor in [1, 1000, 0.001]:
+            graph.zoom(factor)
+            graph.plot()
+            grid, x_axis, y_axis = graph.grid.items
+
+            points = graph.get_canvas().items[grid]
+            vertical = len(graph.grid.ticks(*graph.get_viewport()[0::2], graph.scale[0]))
+            horizontal = len(graph.grid.ticks(*graph.get_viewport()[1::2], graph.scale[1]))
+            self.assertTrue(vertical <= 400 / 50 + 1 and horizontal <= 300 / 50 + 1)
+
+            #Every segment is a whole grid line or a join outside the canvas
+            for i in range(0, len(points) - 2, 2):
+                x0, y0, x1, y1 = points[i:i+4]
+                if x0 == x1 and {y0, y1} == {-2, 302}:
+                    continue
+                if y0 == y1 and {x0, x1} == {-2, 402}:
+                    continue
+                self.assertTrue(x0 == x1 in (-2, 402) or y0 == y1 in (-2, 302), (x0, y0, x1, y1))
+
+    def test_axes_off_screen(self):
+        graph = StubGraph(300, 400)
+        graph.add_axes()
+        graph.pan(1000, 0)
+        graph.plot()
+        self.assertEqual(len(graph.grid.items), 1) #Only the x axis is visible
+
+
 class TestAxis(unittest.TestCase):
     def test_init(self):
         for orientation in ['vertical', 'horizontal']: